@@ -0,0 +1,213 @@
+"""
+Asyncio counterpart of api.PDNSAPI and the models, for running many API
+calls concurrently on one event loop. Requires aiohttp, which is optional.
+
+    async with AsyncPDNSAPI(url, api_key=key, concurrency=50) as api:
+        server = api.server('localhost')
+        zones = await server.zones()
+        await asyncio.gather(*(zone.notify() for zone in zones))
+
+Paths, request bodies and the handling of responses are those of the sync
+models, only the I/O differs. Unlike the sync models, data is not loaded on
+first access: await load() (or get the object from all()) before reading it.
+"""
+
+import asyncio
+import time
+
+from json import loads
+from urllib.parse import urljoin
+
+from api import Instrumented
+import models
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class AsyncPDNSAPI(Instrumented):
+    """
+    Send requests through one pooled aiohttp session, at most concurrency of
+    them at a time however many coroutines are waiting.
+
+    Request records passed to hooks have no connect time: server covers
+    the time until the response headers, connection included.
+    """
+
+    def __init__(self, url, api_key=None, basic_auth=None, verify=True, concurrency=100,
+                 connect_timeout=10, read_timeout=60, pool_size=100):
+        if aiohttp is None:
+            raise ImportError('AsyncPDNSAPI requires aiohttp')
+        self.url = url
+        self.verify = verify
+        self.concurrency = concurrency
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.headers = {'Accept': 'application/json'}
+        self.auth = None
+        if api_key:
+            self.headers['X-API-Key'] = api_key
+        elif basic_auth:
+            self.auth = aiohttp.BasicAuth(*basic_auth)
+        # created on first use, inside the running event loop
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ssl=None if self.verify else False)
+            timeout = aiohttp.ClientTimeout(sock_connect=self.connect_timeout or None,
+                                            sock_read=self.read_timeout or None)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers,
+                                                  auth=self.auth, raise_for_status=True)
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def request(self, method, url, params=None, json=None):
+        """
+        Send a request and return its status code and decoded JSON body
+        (None if empty), raising aiohttp.ClientResponseError on errors.
+        """
+        session = self._get_session()
+        async with self._semaphore:
+            start, wall_start = time.perf_counter(), time.time()
+            async with session.request(method, urljoin(self.url, url), params=params, json=json) as response:
+                headers = time.perf_counter()
+                body = b'' if response.status == 204 else await response.read()
+                received = time.perf_counter()
+                data = loads(body) if body else None
+                if self.hooks:
+                    decoded = time.perf_counter()
+                    self.emit({
+                        'type': 'request',
+                        'method': method,
+                        'path': response.url.path_qs,
+                        'status': response.status,
+                        'bytes': len(body),
+                        'start': wall_start,
+                        'connect': None,
+                        'server': headers - start,
+                        'transfer': received - headers,
+                        'decode': decoded - received if body else None,
+                        'total': decoded - start,
+                    })
+                return response.status, data
+
+    async def get(self, url, params=None):
+        return (await self.request('GET', url, params=params))[1]
+
+    async def post(self, url, json=None):
+        return (await self.request('POST', url, json=json))[1]
+
+    async def put(self, url, json=None):
+        return (await self.request('PUT', url, json=json))[1]
+
+    async def patch(self, url, json=None):
+        return (await self.request('PATCH', url, json=json))[1]
+
+    async def delete(self, url):
+        return (await self.request('DELETE', url))[1]
+
+    async def servers(self):
+        return await AsyncServer.all(self)
+
+    def server(self, name):
+        return AsyncServer(self, name)
+
+
+class AsyncModel(models.Model):
+
+    @property
+    def data(self):
+        return self._data
+
+    @classmethod
+    async def all(cls, api, parent=None):
+        return cls.from_items(api, await api.get(cls.collection_path(parent)), parent=parent)
+
+    @classmethod
+    async def create(cls, api, parent=None, data={}):
+        status, body = await api.request('POST', cls.collection_path(parent), json=data)
+        data = cls.response_data(status, body, data)
+        return cls(api, data[cls.id_attr], parent=parent, data=data)
+
+    async def load(self):
+        self._data = await self.api.get(self.path)
+
+    reload = load
+
+    async def update(self, skip_unchanged=False, **kwargs):
+        if skip_unchanged and self.unchanged_by(kwargs):
+            return False
+        status, body = await self.api.request('PUT', self.path, json=kwargs)
+        self._data = self.response_data(status, body, dict(self._data, **kwargs))
+        return True
+
+    async def delete(self):
+        await self.api.delete(self.path)
+        self._data = {}
+
+
+class AsyncServer(AsyncModel):
+
+    name = models.Server.name
+
+    async def zones(self):
+        return await AsyncZone.all(self.api, parent=self)
+
+    def zone(self, name):
+        return AsyncZone(self.api, name, parent=self)
+
+    async def create_zone(self, name, kind='Master', nameservers=[], **kwargs):
+        return await AsyncZone.create(self.api, parent=self,
+                                      data=models.Server.zone_data(name, kind, nameservers, **kwargs))
+
+    async def delete_zone(self, name):
+        return await AsyncZone(self.api, name, parent=self).delete()
+
+
+class AsyncZone(AsyncModel):
+
+    name = models.Zone.name
+
+    async def load(self, rrsets=True):
+        self._data = await self.api.get(self.path, params=models.Zone.load_params(rrsets))
+
+    reload = load
+
+    @property
+    def rrsets(self):
+        return models.RRsetCollection(models.RRset(**rrset) for rrset in self._data['rrsets'])
+
+    async def update_rrsets(self, rrsets, delete=False):
+        if delete:
+            await self.patch_rrsets(delete=rrsets)
+        else:
+            await self.patch_rrsets(replace=rrsets)
+
+    async def patch_rrsets(self, replace=[], delete=[], comments=True):
+        """
+        Send REPLACE and DELETE changes for any number of RRsets in a single PATCH.
+        """
+        await self.api.patch(self.path, json=models.Zone.patch_body(replace, delete, comments))
+        self._data = {}
+
+    async def notify(self):
+        return await self.api.put(self.subpath('notify'))
+
+    async def axfr_retrieve(self):
+        return await self.api.put(self.subpath('axfr-retrieve'))
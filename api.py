@@ -1,10 +1,51 @@
+from contextlib import contextmanager, nullcontext
 from requests import Session
+from requests.adapters import HTTPAdapter
 from requests.auth import AuthBase
 from urllib.parse import urljoin
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+import random
+import threading
+import time
 
 import models
 
 
+# answers worth another try: rate limiting and errors of (proxies in front of) the server
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class PDNSRetry(Retry):
+    """
+    Retry with "full jitter" exponential backoff, so that concurrent workers
+    hitting the same error don't come back in lockstep.
+
+    Like Retry, only idempotent methods are retried after the request was
+    sent, except on 429 which says the request was not processed at all.
+    Connection errors are retried for every method as nothing was sent.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429 and self.status_forcelist and status_code in self.status_forcelist:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def get_backoff_time(self):
+        errors = len([attempt for attempt in self.history if attempt.redirect_location is None])
+        if errors == 0 or not self.backoff_factor:
+            return 0
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** errors)))
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is not None:
+            retry_after = min(retry_after, self.backoff_max)
+        return retry_after
+
+
 class APIKeyAuth(AuthBase):
 
     def __init__(self, api_key):
@@ -15,9 +56,96 @@ class APIKeyAuth(AuthBase):
         return r
 
 
+# seconds spent opening connections (DNS, TCP and TLS) by the request in
+# progress on each thread, while instrumentation hooks are registered
+_connect_timing = threading.local()
+
+
+class TimedHTTPConnection(HTTPConnection):
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            if getattr(_connect_timing, 'seconds', None) is not None:
+                _connect_timing.seconds += time.perf_counter() - start
+
+
+class TimedHTTPSConnection(TimedHTTPConnection, HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter whose connections record how long they take to open.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': TimedHTTPConnectionPool,
+            'https': TimedHTTPSConnectionPool,
+        }
+
+
+class Instrumented(object):
+    """
+    Instrumentation hooks, shared by PDNSAPI and aioapi.AsyncPDNSAPI.
+    """
+
+    hooks = ()
+
+    def add_hook(self, hook):
+        """
+        Call hook(record) with a dict describing every request and timed span
+        from now on. Request records hold the method, path, status, bytes
+        received and, in seconds, connect (DNS, TCP and TLS, 0 on a reused
+        connection), server (until the response headers), transfer (reading
+        the body), decode (JSON decoding, None if not decoded here) and
+        total; failed requests have an error instead. Span records hold a
+        name and a duration. Both have a type and a start time since the epoch.
+
+        Hooks may be called from several threads at once.
+        """
+        self.hooks = list(self.hooks) + [hook]
+
+    def emit(self, record):
+        for hook in self.hooks:
+            hook(record)
+
+    def span(self, name):
+        """
+        Return a context manager timing its block as a span record, a no-op
+        without hooks.
+        """
+        if not self.hooks:
+            return nullcontext()
+        return self._span(name)
+
+    @contextmanager
+    def _span(self, name):
+        start, wall_start = time.perf_counter(), time.time()
+        try:
+            yield
+        finally:
+            self.emit({'type': 'span', 'name': name, 'start': wall_start,
+                       'duration': time.perf_counter() - start})
+
+
 class BaseURLSession(Session):
 
     base_url = None
+    # default (connect, read) timeout of every request
+    timeout = None
 
     def __init__(self, base_url=None):
         if base_url:
@@ -26,15 +154,19 @@ class BaseURLSession(Session):
 
     def request(self, method, url, *args, **kwargs):
         url = self.create_url(url)
+        kwargs.setdefault('timeout', self.timeout)
         return super().request(method, url, *args, **kwargs)
 
     def create_url(self, url):
         return urljoin(self.base_url, url)
 
 
-class PDNSAPI(object):
+class PDNSAPI(Instrumented):
 
-    def __init__(self, url, api_key=None, basic_auth=None, verify=True):
+    def __init__(self, url, api_key=None, basic_auth=None, verify=True, cache=None, **transport):
+        self.url = url
+        # optional zonecache.ZoneCache consulted by the models
+        self.cache = cache
         self.session = BaseURLSession(url)
         self.session.verify = verify
         self.session.headers.update({'Accept': 'application/json'})
@@ -44,30 +176,144 @@ class PDNSAPI(object):
         elif basic_auth:
             self.session.auth = basic_auth
 
-    def get(self, url, *args, **kwargs):
-        r = self.session.get(url, *args, **kwargs)
+        self.configure_transport(**transport)
+
+    def configure_transport(self, connect_timeout=10, read_timeout=60, retries=3, retry_backoff=0.5,
+                            retry_backoff_max=30, pool_size=10, compression=True):
+        """
+        Set timeouts (in seconds, 0 for none), retries on connection errors
+        and RETRY_STATUSES with jittered exponential backoff (honouring
+        Retry-After up to retry_backoff_max), the number of connections
+        kept per host and whether responses may be compressed.
+        """
+        self.transport = {
+            'connect_timeout': connect_timeout,
+            'read_timeout': read_timeout,
+            'retries': retries,
+            'retry_backoff': retry_backoff,
+            'retry_backoff_max': retry_backoff_max,
+            'pool_size': pool_size,
+            'compression': compression,
+        }
+        self.session.timeout = (connect_timeout or None, read_timeout or None)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate' if compression else 'identity'
+
+        retry = PDNSRetry(total=retries, backoff_factor=retry_backoff, backoff_max=retry_backoff_max,
+                          status_forcelist=RETRY_STATUSES, raise_on_status=False)
+        adapter = TimedHTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def reserve_connections(self, count):
+        """
+        Grow the connection pool to keep count connections per host, for
+        callers about to send that many requests concurrently.
+        """
+        if count > self.transport['pool_size']:
+            self.configure_transport(**dict(self.transport, pool_size=count))
+
+    def for_url(self, url):
+        """
+        Return an API for another URL with the same credentials, settings and hooks.
+        """
+        api = PDNSAPI(url, verify=self.session.verify, cache=self.cache, **self.transport)
+        api.session.auth = self.session.auth
+        api.hooks = self.hooks
+        return api
+
+    def request(self, method, url, *args, **kwargs):
+        r, record = self._send(method, url, *args, **kwargs)
+        if record is not None:
+            self.emit(record)
         r.raise_for_status()
         return r
 
+    def _send(self, method, url, *args, **kwargs):
+        """
+        Send a request, return the response and, with hooks registered, its
+        request record. The record of a streamed response is emitted once its
+        body has been read through iter_content instead.
+        """
+        if not self.hooks:
+            return self.session.request(method, url, *args, **kwargs), None
+
+        _connect_timing.seconds = 0.0
+        start, wall_start = time.perf_counter(), time.time()
+        try:
+            r = self.session.request(method, url, *args, **kwargs)
+        except Exception as e:
+            self.emit({'type': 'request', 'method': method, 'path': url, 'status': None, 'error': str(e),
+                       'start': wall_start, 'total': time.perf_counter() - start})
+            raise
+        finally:
+            connect, _connect_timing.seconds = _connect_timing.seconds, None
+        total = time.perf_counter() - start
+        headers = r.elapsed.total_seconds()
+
+        record = {
+            'type': 'request',
+            'method': method,
+            'path': r.request.path_url,
+            'status': r.status_code,
+            'bytes': None if kwargs.get('stream') else len(r.content),
+            'start': wall_start,
+            'connect': connect,
+            'server': max(0.0, headers - connect),
+            'transfer': total - headers,
+            'decode': None,
+            'total': total,
+        }
+        if kwargs.get('stream'):
+            r.iter_content = self._timed_iter_content(r.iter_content, record, start)
+            return r, None
+        return r, record
+
+    def _timed_iter_content(self, iter_content, record, start):
+        def timed_iter_content(*args, **kwargs):
+            received = 0
+            try:
+                for chunk in iter_content(*args, **kwargs):
+                    received += len(chunk)
+                    yield chunk
+            finally:
+                record['bytes'] = received
+                record['total'] = time.perf_counter() - start
+                record['transfer'] = record['total'] - record['connect'] - record['server']
+                self.emit(record)
+        return timed_iter_content
+
+    def get_json(self, url, *args, **kwargs):
+        """
+        GET url and return its decoded JSON body, timing the decoding.
+        """
+        r, record = self._send('GET', url, *args, **kwargs)
+        if record is None:
+            r.raise_for_status()
+            return r.json()
+        try:
+            r.raise_for_status()
+            start = time.perf_counter()
+            data = r.json()
+            record['decode'] = time.perf_counter() - start
+            record['total'] += record['decode']
+        finally:
+            self.emit(record)
+        return data
+
+    def get(self, url, *args, **kwargs):
+        return self.request('GET', url, *args, **kwargs)
+
     def post(self, url, *args, **kwargs):
-        r = self.session.post(url, *args, **kwargs)
-        r.raise_for_status()
-        return r
+        return self.request('POST', url, *args, **kwargs)
 
     def put(self, url, *args, **kwargs):
-        r = self.session.put(url, *args, **kwargs)
-        r.raise_for_status()
-        return r
+        return self.request('PUT', url, *args, **kwargs)
 
     def patch(self, url, *args, **kwargs):
-        r = self.session.patch(url, *args, **kwargs)
-        r.raise_for_status()
-        return r
+        return self.request('PATCH', url, *args, **kwargs)
 
     def delete(self, url, *args, **kwargs):
-        r = self.session.delete(url, *args, **kwargs)
-        r.raise_for_status()
-        return r
+        return self.request('DELETE', url, *args, **kwargs)
 
     @property
     def servers(self):
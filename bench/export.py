@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Measure the wall time and peak memory of pdns export for growing zone sizes,
+against a stand-in API server started for each size. Memory should stay flat
+as zones grow, since every format is streamed.
+
+    python3 bench/export.py
+    python3 bench/export.py --records 1000 100000 --formats zone csv --pdns ../pdns-cli-old/pdns
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from standin import API_KEY, spawn
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure(pdns, argv):
+    """
+    Run pdns once, return (seconds, peak RSS in MB, exit status).
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, pdns] + argv, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    return elapsed, usage.ru_maxrss / 1024, os.waitstatus_to_exitcode(status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pdns export benchmark')
+    parser.add_argument('--pdns', default=os.path.join(HERE, '..', 'pdns'), help='pdns script to benchmark')
+    parser.add_argument('--records', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='zone sizes to export')
+    parser.add_argument('--formats', nargs='+', default=['zone', 'json', 'ndjson', 'csv'],
+                        choices=('zone', 'json', 'ndjson', 'csv'), help='export formats to time')
+    parser.add_argument('--port', type=int, default=8089, help='port for the stand-in server')
+    args = parser.parse_args()
+
+    print('{:<8} {:>9} {:>9} {:>9}'.format('format', 'records', 'seconds', 'peak MB'))
+    for records in args.records:
+        standin = spawn(args.port, '--zones', 1, '--records', records)
+        url = 'http://127.0.0.1:{}/api/v1/'.format(args.port)
+        try:
+            for export_format in args.formats:
+                argv = ['-u', url, '-k', API_KEY, '-s', 'localhost', 'export', '--format', export_format,
+                        'zone0.example.']
+                # the first request makes the stand-in build the zone
+                measure(args.pdns, argv)
+                elapsed, peak, status = measure(args.pdns, argv)
+                if status:
+                    sys.exit('pdns export --format {} failed with status {}'.format(export_format, status))
+                print('{:<8} {:>9} {:>9.2f} {:>9.1f}'.format(export_format, records, elapsed, peak))
+        finally:
+            standin.terminate()
+            standin.wait()
+
+
+if __name__ == '__main__':
+    main()
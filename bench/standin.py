@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+A stand-in for the PowerDNS HTTP API serving synthetic zones, for benchmarks
+that need a server but not a real one. It implements the subset of the API
+used by pdns: servers, config, zones (listing, create, show with the rrsets,
+rrset_name and rrset_type parameters, edit, delete, RRset PATCH, notify,
+axfr-retrieve, export, check), metadata, cryptokeys, statistics,
+search-data and cache flushes. GET /__stats returns the number of requests
+served so far.
+
+    python3 bench/standin.py --port 8081 --zones 10 --records 1000
+    python3 bench/standin.py --sizes 10,1000,100000,1000000 --latency 5
+    python3 bench/standin.py --flaky 0.1 --hang-rate 0.01 --gzip
+
+Zones are named zone0.example. to zoneN.example. and hold --records A
+records (or the count at their position in --sizes) besides their SOA and
+NS RRsets. Records are generated rather than stored, only changes are kept;
+a zone's serialised form is cached until it changes, so serving it again
+costs little. The API key is "secret".
+
+--latency delays every answer by that many milliseconds, --flaky answers
+that fraction of requests with a 503, a 429 with Retry-After or a dropped
+connection, --hang-rate makes that fraction hang for --hang-time seconds and
+--gzip compresses responses for clients that accept it.
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+API_KEY = 'secret'
+SERVER_ID = 'localhost'
+
+_host_re = re.compile(r'^host(\d+)\.')
+
+
+class SyntheticZone(object):
+    """
+    A zone of generated A records. Replaced and deleted RRsets are kept in
+    changes by (name, type), None meaning deleted.
+    """
+
+    def __init__(self, name, records=0, kind='Native', nameservers=None):
+        self.name = name
+        self.records = records
+        self.kind = kind
+        self.account = ''
+        self.masters = []
+        self.dnssec = False
+        self.serial = 1
+        self.notified_serial = 0
+        self.nameservers = nameservers or ['ns1.{}'.format(name), 'ns2.{}'.format(name)]
+        self.changes = {}
+        self.metadata = {}
+        self.cryptokeys = []
+        self._serialised = {}
+
+    def info(self):
+        return {
+            'id': self.name,
+            'name': self.name,
+            'type': 'Zone',
+            'kind': self.kind,
+            'serial': self.serial,
+            'edited_serial': self.serial,
+            'notified_serial': self.notified_serial,
+            'dnssec': self.dnssec,
+            'account': self.account,
+            'masters': self.masters,
+            'url': '/api/v1/servers/{}/zones/{}'.format(SERVER_ID, self.name),
+        }
+
+    def _host(self, index):
+        return {'name': 'host{}.{}'.format(index, self.name), 'type': 'A', 'ttl': 300, 'comments': [], 'records': [
+            {'content': '10.{}.{}.{}'.format(index >> 16 & 255, index >> 8 & 255, index & 255), 'disabled': False}]}
+
+    def _apex(self):
+        yield {'name': self.name, 'type': 'SOA', 'ttl': 3600, 'comments': [], 'records': [
+            {'content': 'ns1.{0} hostmaster.{0} {1} 10800 3600 604800 3600'.format(self.name, self.serial),
+             'disabled': False}]}
+        yield {'name': self.name, 'type': 'NS', 'ttl': 3600, 'comments': [],
+               'records': [{'content': nameserver, 'disabled': False} for nameserver in self.nameservers]}
+
+    def generated_rrset(self, name, rrtype):
+        if name == self.name:
+            for rrset in self._apex():
+                if rrset['type'] == rrtype:
+                    return rrset
+            return None
+        match = _host_re.match(name)
+        if match and rrtype == 'A':
+            index = int(match.group(1))
+            if index < self.records and name == 'host{}.{}'.format(index, self.name):
+                return self._host(index)
+        return None
+
+    def rrset(self, name, rrtype):
+        key = (name, rrtype)
+        if key in self.changes:
+            return self.changes[key]
+        return self.generated_rrset(name, rrtype)
+
+    def iter_rrsets(self):
+        changes = self.changes
+        generated = (self._host(index) for index in range(self.records))
+        for rrsets in (self._apex(), generated):
+            for rrset in rrsets:
+                key = (rrset['name'], rrset['type'])
+                if key not in changes:
+                    yield rrset
+                elif changes[key] is not None:
+                    yield changes[key]
+        for (name, rrtype), rrset in list(changes.items()):
+            if rrset is not None and self.generated_rrset(name, rrtype) is None:
+                yield rrset
+
+    def serialised(self, kind, build):
+        """
+        Return the chunks of the zone serialised by build, cached until it changes.
+        """
+        if kind not in self._serialised:
+            self._serialised[kind] = [chunk.encode('utf-8') for chunk in build()]
+        return self._serialised[kind]
+
+    def changed(self):
+        self.serial += 1
+        self._serialised = {}
+
+    def patch(self, rrsets):
+        for change in rrsets:
+            key = (change['name'], change['type'])
+            if change['changetype'].upper() == 'DELETE':
+                self.changes[key] = None
+                continue
+            current = self.rrset(*key)
+            rrset = {
+                'name': change['name'],
+                'type': change['type'],
+                'ttl': change.get('ttl', current and current['ttl']),
+                'records': change.get('records', current['records'] if current else []),
+                'comments': change.get('comments', current['comments'] if current else []),
+            }
+            self.changes[key] = rrset if rrset['records'] or rrset['comments'] else None
+        self.changed()
+
+
+def iter_json(zone, rrsets, batch=1000):
+    """
+    Serialise a zone with its RRsets, batch RRsets per chunk.
+    """
+    yield json.dumps(zone)[:-1] + ', "rrsets": ['
+    separator = ''
+    chunk = []
+    for rrset in rrsets:
+        chunk.append(json.dumps(rrset))
+        if len(chunk) >= batch:
+            yield separator + ', '.join(chunk)
+            separator = ', '
+            chunk = []
+    if chunk:
+        yield separator + ', '.join(chunk)
+    yield ']}'
+
+
+def iter_export(rrsets, batch=1000):
+    lines = []
+    for rrset in rrsets:
+        for record in rrset['records']:
+            lines.append('{}\t{}\tIN\t{}\t{}\n'.format(rrset['name'], rrset['ttl'], rrset['type'], record['content']))
+        if len(lines) >= batch:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+class StandinAPI(object):
+
+    def __init__(self, zones=10, records=1000, sizes=None, latency=0, flaky=0, hang_rate=0, hang_time=60,
+                 gzip=False, seed=None):
+        self.zones = {}
+        for index, size in enumerate(sizes or [records] * zones):
+            name = 'zone{}.example.'.format(index)
+            self.zones[name] = SyntheticZone(name, size)
+        self.latency = latency
+        self.flaky = flaky
+        self.hang_rate = hang_rate
+        self.hang_time = hang_time
+        self.gzip = gzip
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.started = time.time()
+        self.config = [
+            {'type': 'ConfigSetting', 'name': 'api', 'value': 'yes'},
+            {'type': 'ConfigSetting', 'name': 'default-soa-edit', 'value': 'INCEPTION-INCREMENT'},
+            {'type': 'ConfigSetting', 'name': 'webserver', 'value': 'yes'},
+        ]
+
+    def fault(self):
+        """
+        Count a request and return the fault to inject in it: None, 'hang',
+        '503', '429' or 'drop'.
+        """
+        with self.lock:
+            self.requests += 1
+            draw = self.random.random()
+            if draw < self.hang_rate:
+                return 'hang'
+            if draw < self.hang_rate + self.flaky:
+                return self.random.choice(('503', '429', 'drop'))
+        return None
+
+    def statistics(self):
+        queries = int((time.time() - self.started) * 1000)
+        return [
+            {'type': 'StatisticItem', 'name': 'udp-queries', 'value': str(queries)},
+            {'type': 'StatisticItem', 'name': 'packetcache-hit', 'value': str(queries * 3 // 4)},
+            {'type': 'StatisticItem', 'name': 'uptime', 'value': str(int(time.time() - self.started))},
+            {'type': 'MapStatisticItem', 'name': 'response-by-qtype',
+             'value': [{'name': 'A', 'value': str(queries // 2)}, {'name': 'AAAA', 'value': str(queries // 4)}]},
+        ]
+
+    def search(self, q, limit, object_type):
+        pattern = re.compile(fnmatch.translate(q), re.IGNORECASE)
+        results = []
+        for zone in list(self.zones.values()):
+            if object_type in ('all', 'zone') and pattern.match(zone.name):
+                results.append({'object_type': 'zone', 'name': zone.name, 'zone_id': zone.name})
+            if object_type not in ('all', 'record'):
+                continue
+            for rrset in zone.iter_rrsets():
+                if len(results) >= limit:
+                    return results[:limit]
+                for record in rrset['records']:
+                    if pattern.match(rrset['name']) or pattern.match(record['content']):
+                        results.append({'object_type': 'record', 'name': rrset['name'], 'type': rrset['type'],
+                                        'content': record['content'], 'ttl': rrset['ttl'],
+                                        'disabled': record['disabled'], 'zone': zone.name, 'zone_id': zone.name})
+        return results[:limit]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    api = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _compressor(self):
+        if self.api.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            return zlib.compressobj(1, zlib.DEFLATED, 31)
+        return None
+
+    def send(self, status, body=b'', content_type='application/json', headers={}):
+        if status == 204:
+            body = b''
+        elif not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        compressor = self._compressor() if body else None
+        if compressor:
+            body = compressor.compress(body) + compressor.flush()
+        self.send_response(status)
+        if body:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if compressor:
+            self.send_header('Content-Encoding', 'gzip')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunked(self, chunks, content_type='application/json'):
+        """
+        Send a 200 response piece by piece with chunked transfer encoding.
+        """
+        compressor = self._compressor()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        if compressor:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+
+        def write(data):
+            if data:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+        for chunk in chunks:
+            write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            write(compressor.flush())
+        self.wfile.write(b'0\r\n\r\n')
+
+    def inject_fault(self):
+        """
+        Fail the request if the dice say so, return True when it was.
+        """
+        fault = self.api.fault()
+        if fault is None:
+            return False
+        if fault == 'hang':
+            time.sleep(self.api.hang_time)
+            self.close_connection = True
+        elif fault == 'drop':
+            self.close_connection = True
+        elif fault == '429':
+            self.send(429, {'error': 'Too Many Requests'}, headers={'Retry-After': '1'})
+        else:
+            self.send(503, {'error': 'Service Unavailable'})
+        return True
+
+    def handle_request(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if path == '/__stats':
+            return self.send(200, {'requests': self.api.requests})
+        if self.inject_fault():
+            return
+        if self.api.latency:
+            time.sleep(self.api.latency / 1000.0)
+        if self.headers.get('X-API-Key') != API_KEY:
+            return self.send(401, {'error': 'Unauthorized'})
+
+        if path.rstrip('/') == '/api/v1/servers':
+            return self.send(200, [self.server_info()])
+        match = re.match(r'^/api/v1/servers/([^/]+)/?(.*)$', path)
+        if match is None or match.group(1) != SERVER_ID:
+            return self.send(404, {'error': 'Not Found'})
+        parts = match.group(2).split('/') if match.group(2) else []
+
+        if method == 'GET':
+            return self.route(method, parts, query, body)
+        with self.api.lock:
+            return self.route(method, parts, query, body)
+
+    def server_info(self):
+        return {'id': SERVER_ID, 'type': 'Server', 'daemon_type': 'authoritative', 'version': 'standin',
+                'url': '/api/v1/servers/' + SERVER_ID,
+                'config_url': '/api/v1/servers/{}/config{{/config_setting}}'.format(SERVER_ID),
+                'zones_url': '/api/v1/servers/{}/zones{{/zone}}'.format(SERVER_ID)}
+
+    def route(self, method, parts, query, body):
+        api = self.api
+        if not parts:
+            return self.send(200, self.server_info())
+
+        if parts[0] == 'config':
+            if len(parts) == 1:
+                return self.send(200, api.config)
+            for setting in api.config:
+                if setting['name'] == parts[1]:
+                    return self.send(200, setting)
+            return self.send(404, {'error': 'Not Found'})
+
+        if parts == ['statistics']:
+            items = api.statistics()
+            if 'statistic' in query:
+                items = [item for item in items if item['name'] == query['statistic']]
+                if not items:
+                    return self.send(422, {'error': 'Unknown statistic name'})
+            return self.send(200, items)
+
+        if parts == ['search-data']:
+            return self.send(200, api.search(query.get('q', ''), int(query.get('max', 100)),
+                                             query.get('object_type', 'all')))
+
+        if parts == ['cache', 'flush'] and method == 'PUT':
+            return self.send(200, {'count': 1, 'result': 'Flushed cache.'})
+
+        if parts[0] != 'zones':
+            return self.send(404, {'error': 'Not Found'})
+
+        if len(parts) == 1:
+            if method == 'POST':
+                if body['name'] in api.zones:
+                    return self.send(409, {'error': 'Conflict'})
+                zone = SyntheticZone(body['name'], kind=body.get('kind', 'Native'),
+                                     nameservers=body.get('nameservers'))
+                zone.masters = body.get('masters', [])
+                zone.account = body.get('account', '')
+                if body.get('rrsets'):
+                    zone.patch([dict(rrset, changetype='REPLACE') for rrset in body['rrsets']])
+                api.zones[zone.name] = zone
+                return self.send(201, zone.info())
+            zones = list(api.zones.values())
+            if 'zone' in query:
+                zones = [zone for zone in zones if zone.name == query['zone']]
+            return self.send(200, [zone.info() for zone in zones])
+
+        zone = api.zones.get(parts[1])
+        if zone is None:
+            return self.send(404, {'error': 'Could not find domain \'{}\''.format(parts[1])})
+
+        if len(parts) == 2:
+            if method == 'GET':
+                if query.get('rrsets') == 'false':
+                    return self.send(200, zone.info())
+                if 'rrset_name' in query:
+                    if 'rrset_type' in query:
+                        rrset = zone.rrset(query['rrset_name'], query['rrset_type'])
+                        rrsets = [rrset] if rrset else []
+                    else:
+                        rrsets = [rrset for rrset in zone.iter_rrsets() if rrset['name'] == query['rrset_name']]
+                    return self.send(200, dict(zone.info(), rrsets=rrsets))
+                return self.send_chunked(zone.serialised('json', lambda: iter_json(zone.info(), zone.iter_rrsets())))
+            if method == 'PATCH':
+                zone.patch(body.get('rrsets', []))
+                return self.send(204)
+            if method == 'PUT':
+                for key in ('kind', 'account', 'masters', 'dnssec'):
+                    if key in body:
+                        setattr(zone, key, body[key])
+                zone.changed()
+                return self.send(204)
+            if method == 'DELETE':
+                del api.zones[zone.name]
+                return self.send(204)
+
+        action = parts[2]
+        if action == 'notify' and method == 'PUT':
+            zone.notified_serial = zone.serial
+            return self.send(200, {'result': 'Notification queued'})
+        if action == 'axfr-retrieve' and method == 'PUT':
+            return self.send(200, {'result': 'Added retrieval request for \'{}\' from master'.format(zone.name)})
+        if action == 'export':
+            return self.send_chunked(zone.serialised('export', lambda: iter_export(zone.iter_rrsets())),
+                                     content_type='text/plain; charset=us-ascii')
+        if action == 'check':
+            return self.send(200, {'zone': zone.name, 'result': 'Zone is OK'})
+        if action == 'cryptokeys':
+            if len(parts) == 3:
+                if method == 'POST':
+                    flags = 257 if body.get('keytype', 'csk') in ('ksk', 'csk') else 256
+                    key_id = max([key['id'] for key in zone.cryptokeys] + [0]) + 1
+                    cryptokey = {'type': 'Cryptokey', 'id': key_id, 'keytype': body.get('keytype', 'csk'),
+                                 'active': body.get('active', False), 'published': body.get('published', True),
+                                 'algorithm': 'ECDSAP256SHA256', 'bits': 256,
+                                 'dnskey': '{} 3 13 c3RhbmRpbi1rZXkte30='.format(flags),
+                                 'privatekey': 'Private-key-format: v1.2\nAlgorithm: 13 (ECDSAP256SHA256)\n'}
+                    zone.cryptokeys.append(cryptokey)
+                    zone.dnssec = True
+                    zone.changed()
+                    return self.send(201, cryptokey)
+                return self.send(200, [{key: value for key, value in cryptokey.items() if key != 'privatekey'}
+                                       for cryptokey in zone.cryptokeys])
+            for cryptokey in zone.cryptokeys:
+                if str(cryptokey['id']) == parts[3]:
+                    if method == 'DELETE':
+                        zone.cryptokeys.remove(cryptokey)
+                        zone.dnssec = bool(zone.cryptokeys)
+                        zone.changed()
+                        return self.send(204)
+                    return self.send(200, cryptokey)
+            return self.send(404, {'error': 'Could not find cryptokey'})
+        if action == 'metadata':
+            if len(parts) == 3:
+                if method == 'POST':
+                    zone.metadata.setdefault(body['kind'], []).extend(body['metadata'])
+                    return self.send(201, {'type': 'Metadata', 'kind': body['kind'],
+                                           'metadata': zone.metadata[body['kind']]})
+                return self.send(200, [{'type': 'Metadata', 'kind': kind, 'metadata': values}
+                                       for kind, values in zone.metadata.items()])
+            kind = parts[3]
+            if method == 'PUT':
+                zone.metadata[kind] = body['metadata']
+            elif method == 'DELETE':
+                zone.metadata.pop(kind, None)
+                return self.send(204)
+            return self.send(200, {'type': 'Metadata', 'kind': kind, 'metadata': zone.metadata.get(kind, [])})
+        return self.send(404, {'error': 'Not Found'})
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_PATCH(self):
+        self.handle_request('PATCH')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+class StandinServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients giving up on hanging requests are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(port=8081, zones=10, records=1000, host='127.0.0.1', **options):
+    """
+    Start the stand-in in a background thread and return the HTTP server.
+    options are passed on to StandinAPI.
+    """
+    handler = type('Handler', (Handler,), {'api': StandinAPI(zones, records, **options)})
+    server = StandinServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def spawn(port, *options):
+    """
+    Run the stand-in in its own process with the given command line options
+    and return the Popen once it accepts connections. Benchmarks measuring
+    child processes shouldn't serve from their own process, as its memory
+    would count towards every child forked from it.
+    """
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--port', str(port)]
+                               + [str(option) for option in options], stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('stand-in server did not start on port {}'.format(port))
+
+
+def requests_served(port):
+    """
+    Return the number of requests a stand-in on port has served.
+    """
+    connection = socket.create_connection(('127.0.0.1', port))
+    try:
+        connection.sendall(b'GET /__stats HTTP/1.0\r\n\r\n')
+        response = b''
+        while True:
+            data = connection.recv(65536)
+            if not data:
+                break
+            response += data
+    finally:
+        connection.close()
+    return json.loads(response.split(b'\r\n\r\n', 1)[1])['requests']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='stand-in PowerDNS API server')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8081, help='port to listen on')
+    parser.add_argument('--zones', type=int, default=10, help='number of zones')
+    parser.add_argument('--records', type=int, default=1000, help='A records per zone')
+    parser.add_argument('--sizes', metavar='N,...',
+                        help='comma separated record counts, one zone each, instead of --zones and --records')
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds added to every answer')
+    parser.add_argument('--flaky', type=float, default=0, help='fraction of requests failing (default: 0)')
+    parser.add_argument('--hang-rate', type=float, default=0, help='fraction of requests hanging (default: 0)')
+    parser.add_argument('--hang-time', type=float, default=60, help='seconds a hanging request takes (default: 60)')
+    parser.add_argument('--gzip', action='store_true', help='compress responses')
+    parser.add_argument('--seed', type=int, help='random seed for reproducible faults')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')] if args.sizes else None
+    server = serve(args.port, args.zones, args.records, args.host, sizes=sizes, latency=args.latency,
+                   flaky=args.flaky, hang_rate=args.hang_rate, hang_time=args.hang_time, gzip=args.gzip,
+                   seed=args.seed)
+    print('serving {} zones on http://{}:{}/api/v1/'.format(
+        len(server.RequestHandlerClass.api.zones), args.host, args.port))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Measure the wall time of short pdns invocations, which is mostly interpreter
+startup, imports and argument parsing.
+
+    python3 bench/startup.py
+    python3 bench/startup.py --runs 50 --pdns ../pdns-cli-old/pdns
+    python3 bench/startup.py --url http://127.0.0.1:8081/api/v1/ --api-key secret
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def scenarios(args):
+    yield 'help', ['-h'], {}
+    yield 'action help', ['list-zones', '-h'], {}
+    yield 'rrset help', ['edit-rrset', '-h'], {}
+
+    comp_line = 'pdns edit-rrset --'
+    yield 'completion', [], {
+        '_ARGCOMPLETE': '1',
+        '_ARGCOMPLETE_STDOUT_FILENAME': os.devnull,
+        'COMP_LINE': comp_line,
+        'COMP_POINT': str(len(comp_line)),
+        'COMP_TYPE': '9',
+    }
+
+    if args.url:
+        yield 'list-servers', ['-u', args.url, '-k', args.api_key, 'list-servers'], {}
+
+
+def measure(pdns, argv, env, runs):
+    env = dict(os.environ, **env)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, pdns] + argv, env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pdns startup time benchmark')
+    parser.add_argument('--pdns', default=os.path.join(HERE, '..', 'pdns'), help='pdns script to benchmark')
+    parser.add_argument('--runs', type=int, default=20, help='runs per scenario')
+    parser.add_argument('--url', help='also time list-servers against this API URL')
+    parser.add_argument('--api-key', default='secret', help='API key for --url')
+    args = parser.parse_args()
+
+    print('{:<14} {:>9} {:>9} {:>9}'.format('scenario', 'min ms', 'median ms', 'mean ms'))
+    for name, argv, env in scenarios(args):
+        timings = measure(args.pdns, argv, env, args.runs)
+        print('{:<14} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+            name, min(timings) * 1000, statistics.median(timings) * 1000, statistics.mean(timings) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Measure the wall time, number of API requests and peak memory of common
+pdns commands on zones of growing sizes, against a stand-in API server, and
+compare the results with those of another run or another checkout.
+
+    python3 bench/suite.py
+    python3 bench/suite.py --sizes 10 1000 100000 1000000 --latency 5 --save after.json
+    python3 bench/suite.py --pdns ../pdns-cli-old/pdns --save before.json
+    python3 bench/suite.py --compare before.json
+
+Every scenario runs --runs times and the fastest run is kept; request
+counts come from the stand-in and peak memory is that of the pdns process.
+Scenarios a checkout doesn't support (a missing action or option) are
+reported as failed.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from standin import API_KEY, requests_served, spawn
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def scenarios(sizes, workdir):
+    """
+    Yield (name, argv) for every scenario, zoneN.example. holding sizes[N]
+    records. argv may contain '{run}', replaced by the run number so writes
+    change something every run.
+    """
+    yield 'list-zones', ['list-zones']
+
+    for index, size in enumerate(sizes):
+        zone = 'zone{}.example.'.format(index)
+        yield 'show-rrsets {}'.format(size), ['show-rrsets', zone]
+        yield 'show-rrsets --unsorted {}'.format(size), ['show-rrsets', '--unsorted', zone]
+        yield 'edit-rrset {}'.format(size), ['edit-rrset', '--replace', '--ttl', '{run}', zone,
+                                             'host0.' + zone, 'A', '192.0.2.1']
+
+        # a thousand changes to existing and new names
+        changes_path = os.path.join(workdir, 'changes{}.jsonl'.format(index))
+        with open(changes_path, 'w') as changes_file:
+            for i in range(1000):
+                changes_file.write(json.dumps({
+                    'zone': zone, 'mode': 'replace' if i % 2 else 'add', 'type': 'A',
+                    'name': 'host{}.{}'.format(i if i % 2 else size + i, zone),
+                    'content': '192.0.2.{}'.format(i % 250 + 1), 'ttl': 300,
+                }) + '\n')
+        yield 'apply 1000 changes {}'.format(size), ['apply', changes_path]
+        yield 'set-ttl {}'.format(size), ['set-ttl', zone, '--ttl', '{run}', '--type', 'A']
+
+
+def measure(pdns, argv, port):
+    """
+    Run pdns once, return (seconds, requests, peak RSS in MB, exit status).
+    """
+    before = requests_served(port)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, pdns] + argv, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    return elapsed, requests_served(port) - before, usage.ru_maxrss / 1024, os.waitstatus_to_exitcode(status)
+
+
+def run_suite(args, workdir):
+    url = 'http://127.0.0.1:{}/api/v1/'.format(args.port)
+    options = ['--sizes', ','.join(str(size) for size in args.sizes), '--latency', args.latency]
+    results = {}
+    for name, argv in scenarios(args.sizes, workdir):
+        if args.only and not any(word in name for word in args.only):
+            continue
+        # a fresh server per scenario, so writes of earlier scenarios and
+        # runs don't grow the zones
+        standin = spawn(args.port, *options)
+        try:
+            best = None
+            for run in range(args.runs):
+                command = ['-u', url, '-k', API_KEY, '-s', 'localhost'] + [
+                    str(3600 + run) if arg == '{run}' else arg for arg in argv]
+                elapsed, requests, peak, status = measure(args.pdns, command, args.port)
+                if status:
+                    best = None
+                    break
+                if best is None or elapsed < best[0]:
+                    best = (elapsed, requests, peak)
+        finally:
+            standin.terminate()
+            standin.wait()
+
+        if best is None:
+            results[name] = None
+        else:
+            results[name] = {'seconds': best[0], 'requests': best[1], 'peak_mb': best[2]}
+        yield name, results[name]
+
+
+def delta(value, previous):
+    if not previous:
+        return ''
+    return '{:+.0f}%'.format((value - previous) / previous * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pdns benchmark suite')
+    parser.add_argument('--pdns', default=os.path.join(HERE, '..', 'pdns'), help='pdns script to benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000],
+                        help='records of the zones to benchmark on (default: 10 1000 100000)')
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds the stand-in adds to every answer')
+    parser.add_argument('--runs', type=int, default=3, help='runs per scenario, the fastest is kept (default: 3)')
+    parser.add_argument('--only', nargs='+', metavar='WORD', help='only run scenarios whose name contains WORD')
+    parser.add_argument('--save', metavar='FILE', help='write the results to FILE as JSON')
+    parser.add_argument('--compare', metavar='FILE', help='show the change from the results saved in FILE')
+    parser.add_argument('--port', type=int, default=8089, help='port for the stand-in server')
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as compare_file:
+            previous = json.load(compare_file)['results']
+
+    workdir = tempfile.mkdtemp(prefix='pdns-bench-')
+    results = {}
+    print('{:<30} {:>9} {:>7} {:>9} {:>7} {:>9} {:>7}'.format(
+        'scenario', 'seconds', '', 'requests', '', 'peak MB', ''))
+    try:
+        for name, result in run_suite(args, workdir):
+            results[name] = result
+            if result is None:
+                print('{:<30} {:>9}'.format(name, 'failed'), flush=True)
+                continue
+            before = previous.get(name) or {}
+            print('{:<30} {:>9.3f} {:>7} {:>9} {:>7} {:>9.1f} {:>7}'.format(
+                name, result['seconds'], delta(result['seconds'], before.get('seconds')),
+                result['requests'], delta(result['requests'], before.get('requests')),
+                result['peak_mb'], delta(result['peak_mb'], before.get('peak_mb'))), flush=True)
+    finally:
+        shutil.rmtree(workdir)
+
+    if args.save:
+        with open(args.save, 'w') as save_file:
+            json.dump({'pdns': os.path.abspath(args.pdns), 'sizes': args.sizes, 'latency': args.latency,
+                       'runs': args.runs, 'results': results}, save_file, indent=2)
+            save_file.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Show the effect of the [api] transport settings: snapshot every zone of a
+flaky stand-in server (failing or dropping some requests, hanging a few)
+with and without timeouts and retries.
+
+    python3 bench/transport.py
+    python3 bench/transport.py --zones 500 --flaky 0.05 --hang-rate 0.005 --workers 16
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from standin import API_KEY, spawn
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = (
+    ('no timeouts, no retries', {'connect-timeout': 0, 'read-timeout': 0, 'retries': 0}),
+    ('timeouts, no retries', {'read-timeout': 2, 'retries': 0}),
+    ('timeouts and retries', {'read-timeout': 2, 'retries': 3, 'retry-backoff': 0.1}),
+)
+
+
+def write_config(path, options):
+    with open(path, 'w') as config_file:
+        config_file.write('[api]\n')
+        for key, value in options.items():
+            config_file.write('{} = {}\n'.format(key, value))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pdns HTTP transport benchmark')
+    parser.add_argument('--pdns', default=os.path.join(HERE, '..', 'pdns'), help='pdns script to benchmark')
+    parser.add_argument('--zones', type=int, default=200, help='zones on the stand-in server')
+    parser.add_argument('--records', type=int, default=100, help='records per zone')
+    parser.add_argument('--flaky', type=float, default=0.1, help='fraction of failing requests')
+    parser.add_argument('--hang-rate', type=float, default=0.01, help='fraction of hanging requests')
+    parser.add_argument('--hang-time', type=float, default=20, help='seconds a hanging request takes')
+    parser.add_argument('--workers', type=int, default=8, help='snapshot --workers')
+    parser.add_argument('--port', type=int, default=8089, help='port for the stand-in server')
+    args = parser.parse_args()
+
+    url = 'http://127.0.0.1:{}/api/v1/'.format(args.port)
+    workdir = tempfile.mkdtemp(prefix='pdns-bench-')
+    print('{:<26} {:>9} {:>7} {:>7}'.format('scenario', 'seconds', 'saved', 'failed'))
+    try:
+        for name, options in SCENARIOS:
+            # a fresh server with the same seed fails the same requests
+            standin = spawn(args.port, '--zones', args.zones, '--records', args.records, '--flaky', args.flaky,
+                            '--hang-rate', args.hang_rate, '--hang-time', args.hang_time, '--seed', 1)
+            try:
+                config_path = os.path.join(workdir, 'conf.toml')
+                write_config(config_path, options)
+                target = os.path.join(workdir, 'snapshot')
+                shutil.rmtree(target, ignore_errors=True)
+
+                start = time.perf_counter()
+                result = subprocess.run([sys.executable, args.pdns, '-c', config_path, '-u', url, '-k', API_KEY,
+                                         '-s', 'localhost', 'snapshot', '--full', '--workers', str(args.workers),
+                                         target], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                        universal_newlines=True)
+                elapsed = time.perf_counter() - start
+            finally:
+                standin.terminate()
+                standin.wait()
+
+            saved = len([filename for filename in os.listdir(target) if filename.endswith('.json.gz')]
+                        if os.path.isdir(target) else [])
+            failed = args.zones - saved if result.returncode else 0
+            print('{:<26} {:>9.2f} {:>7} {:>7}'.format(name, elapsed, saved, failed))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
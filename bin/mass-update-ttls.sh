@@ -52,16 +52,14 @@ done
 if [ -z "${zone}" ]; then
     error "You must supply a zone to operate on"
 fi
-domains="$(./pdns show-rrsets $zone | awk '{ print $1" "$4" "$5}')"
+# Fetches the zone once and rewrites every matching TTL in a single PATCH;
+# multi-record RRsets keep all of their records.
+# The zone goes first, --exclude-type would take it as one more type otherwise.
+args=(set-ttl "$zone" --ttl "$ttl" --exclude-type TXT MX SOA NS)
 if [ ! -z "${filter}" ]; then
-    domains="$(echo "$domains" | grep $filter)"
+    args+=(--name "$filter")
 fi
-#don't include non CNAME/ALIAS/A/AAAA domains 
-domains="$(echo "$domains" | grep -v "TXT" | grep -v "MX" | grep -v "SOA" | grep -v "NS")"
-while read -r line; do
-    echo "./pdns edit-rrset --ttl $ttl --replace $zone $line";
-    if [ ! -z "${do}" ]; then
-        ./pdns edit-rrset --ttl $ttl --replace $zone $line
-    fi;
-done <<< "$domains"
-exit ${rc}
+if [ -z "${do}" ]; then
+    args+=(--dry-run)
+fi
+./pdns "${args[@]}"
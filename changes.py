@@ -0,0 +1,185 @@
+import time
+
+from models import RRset, Record
+from tabular import RowError, iter_rows
+
+
+DEFAULT_TTL = 300
+
+
+class ChangeError(ValueError):
+    pass
+
+
+class Change(object):
+    """
+    A single RRset edit, equivalent to one edit-rrset/delete-rrset invocation.
+
+    mode is one of add, replace, delete or delete-rrset; a delete without
+    content removes the whole RRset.
+    """
+
+    MODES = ('add', 'replace', 'delete', 'delete-rrset')
+
+    def __init__(self, zone, mode, name, type, content=None, ttl=None, disabled=False, set_ptr=False):
+        if mode not in self.MODES:
+            raise ChangeError('invalid mode {!r}, expected one of {}'.format(mode, ', '.join(self.MODES)))
+        if mode in ('add', 'replace') and not content:
+            raise ChangeError('{} requires a record content'.format(mode))
+        self.zone = zone
+        self.mode = mode
+        self.name = name
+        self.type = type.upper()
+        self.content = content or None
+        self.ttl = ttl
+        self.disabled = disabled
+        self.set_ptr = set_ptr
+
+    @property
+    def deletes_rrset(self):
+        return self.mode == 'delete-rrset' or (self.mode == 'delete' and self.content is None)
+
+    def qualified_name(self, zone_name):
+        if self.name.endswith('.'):
+            return self.name
+        if self.name in ('', '@'):
+            return zone_name
+        return '{}.{}'.format(self.name, zone_name)
+
+    def record(self):
+        return Record(content=self.content, disabled=self.disabled, set_ptr=self.set_ptr)
+
+    def __repr__(self):
+        return '<Change {} {} {} {}>'.format(self.mode, self.name, self.type, self.content)
+
+
+class ZoneResult(object):
+    """
+    Outcome of applying the changes for one zone.
+    """
+
+    def __init__(self, zone, changes, replaced, deleted, elapsed, unchanged=0):
+        self.zone = zone
+        self.changes = changes
+        self.replaced = replaced
+        self.deleted = deleted
+        self.elapsed = elapsed
+        self.unchanged = unchanged
+
+    @property
+    def rrsets(self):
+        return self.replaced + self.deleted
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def _parse_change(fields, zone, lineno):
+    try:
+        ttl = fields.get('ttl')
+        return Change(zone=fields.get('zone', zone),
+                      mode=fields.get('mode', 'add'),
+                      name=fields['name'],
+                      type=fields['type'],
+                      content=fields.get('content'),
+                      ttl=int(ttl) if ttl is not None else None,
+                      disabled=_parse_bool(fields.get('disabled', False)),
+                      set_ptr=_parse_bool(fields.get('set_ptr', False)))
+    except KeyError as e:
+        raise ChangeError('line {}: missing field {}'.format(lineno, e))
+    except (ChangeError, ValueError) as e:
+        raise ChangeError('line {}: {}'.format(lineno, e))
+
+
+def read_changes(fileobj, format='jsonl', zone=None):
+    """
+    Read changes from a JSONL or CSV (with a header row) file object.
+
+    Each entry has the fields zone, mode, name, type, content, ttl, disabled
+    and set_ptr; zone may be omitted when a default zone is given.
+    """
+    try:
+        for lineno, fields in iter_rows(fileobj, format):
+            change = _parse_change(fields, zone, lineno)
+            if not change.zone:
+                raise ChangeError('line {}: no zone given'.format(lineno))
+            yield change
+    except RowError as e:
+        raise ChangeError(str(e))
+
+
+def group_changes(changes):
+    """
+    Group changes by zone, keeping the order in which zones first appear.
+    """
+    zones = {}
+    for change in changes:
+        zones.setdefault(change.zone, []).append(change)
+    return zones
+
+
+def merge_changes(zone, changes):
+    """
+    Merge changes for one zone against its current RRsets.
+
+    Returns the RRsets to replace, the RRsets to delete and the number of
+    RRsets the changes leave as they are, which are not sent. Within a batch
+    the first replace of an RRset clears its records and later ones add to it.
+    """
+    existing = zone.rrsets
+    touched = {}
+    replaced = set()
+    # state of every touched RRset before the changes, None if it didn't exist
+    before = {}
+
+    for change in changes:
+        key = (change.qualified_name(zone.data['name']), change.type)
+        if key not in before:
+            current = existing.get(*key)
+            before[key] = current.state() if current is not None else None
+        if change.deletes_rrset:
+            touched[key] = RRset(name=key[0], type=key[1])
+            replaced.add(key)
+            continue
+
+        rrset = touched.get(key) or existing.get(*key) or RRset(name=key[0], type=key[1])
+        touched[key] = rrset
+        if change.ttl is not None:
+            rrset.ttl = change.ttl
+        elif rrset.ttl is None:
+            rrset.ttl = DEFAULT_TTL
+
+        record = change.record()
+        if change.mode == 'add':
+            rrset.records.discard(record)
+            rrset.records.add(record)
+        elif change.mode == 'replace':
+            if key not in replaced:
+                rrset.records.clear()
+                replaced.add(key)
+            rrset.records.add(record)
+        elif change.mode == 'delete':
+            rrset.records.discard(record)
+
+    to_replace = [rrset for key, rrset in touched.items() if rrset.records and rrset.state() != before[key]]
+    to_delete = [rrset for key, rrset in touched.items() if not rrset.records and key in existing]
+    return to_replace, to_delete, len(touched) - len(to_replace) - len(to_delete)
+
+
+def apply_changes(server, changes):
+    """
+    Apply changes with one zone GET and one rrsets PATCH per zone.
+
+    Yields a ZoneResult for each zone as soon as its PATCH has been sent.
+    """
+    for zone_id, zone_changes in group_changes(changes).items():
+        start = time.monotonic()
+        zone = server.zone(zone_id)
+        to_replace, to_delete, unchanged = merge_changes(zone, zone_changes)
+        if to_replace or to_delete:
+            zone.patch_rrsets(replace=to_replace, delete=to_delete)
+        yield ZoneResult(zone_id, len(zone_changes), len(to_replace), len(to_delete),
+                         time.monotonic() - start, unchanged)
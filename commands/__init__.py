@@ -1,21 +1,96 @@
-import colored
+import importlib
 import sys
 
 
 __all__ = (
     'PDNSCommand', 'PDNSCommandException',
-    'server',
-    'zone',
-    'rrset',
-    'metadata',
-    'cryptokey',
-    'cache',
-    'config',
-    'search',
-    'statistics',
+    'ACTIONS', 'load_command', 'add_action_parser', 'add_target_arguments', 'add_endpoint_arguments',
 )
 
 
+# Static action -> (module, class, help) table, so that only the module of the
+# selected action has to be imported and asked to build its parser.
+ACTIONS = {
+    'list-servers': ('server', 'SERVER', 'list servers'),
+    'show-server': ('server', 'SERVER', 'show details for a server'),
+    'add-server': ('server', 'SERVER', 'add a new server (pdnscontrol only)'),
+    'edit-server': ('server', 'SERVER', 'edit a server (pdnscontrol only)'),
+    'delete-server': ('server', 'SERVER', 'delete a server (pdnscontrol only)'),
+    'list-config': ('config', 'CONFIG', 'list config settings'),
+    'list-zones': ('zone', 'ZONE', 'list zones'),
+    'show-zone': ('zone', 'ZONE', 'show details for a zone'),
+    'add-zone': ('zone', 'ZONE', 'add a new zone, return zone ID'),
+    'add-zones': ('zone', 'ZONE', 'create zones from a CSV or JSONL file'),
+    'edit-zone': ('zone', 'ZONE', 'edit a zone'),
+    'delete-zone': ('zone', 'ZONE', 'delete a zone'),
+    'show-rrsets': ('rrset', 'RRSET', 'show Resource Record sets for a zone'),
+    'edit-rrset': ('rrset', 'RRSET', 'add/replace/delete a record in Resource Record set'),
+    'delete-rrset': ('rrset', 'RRSET', 'delete a Resource Record set'),
+    'edit-rrset-comments': ('rrset', 'RRSET', 'add/replace/delete a comment in Resource Record set'),
+    'apply': ('rrset', 'RRSET', 'apply a file of RRset changes with one PATCH per zone'),
+    'set-ttl': ('rrset', 'RRSET', 'rewrite the TTL of matching Resource Record sets in one PATCH'),
+    'notify': ('config', 'CONFIG', 'send a DNS NOTIFY to all slaves for a zone'),
+    'axfr-retrieve': ('config', 'CONFIG', 'retrieve a zone from the master'),
+    'export': ('config', 'CONFIG', 'export a zone in AXFR format'),
+    'check': ('config', 'CONFIG', 'verify a zone content/configuration'),
+    'list-metadata': ('metadata', 'METADATA', 'list all metadata for a zone'),
+    'show-metadata': ('metadata', 'METADATA', 'show metadata of a given kind for a zone'),
+    'add-metadata': ('metadata', 'METADATA', 'add a new set of metadata for a zone'),
+    'edit-metadata': ('metadata', 'METADATA', 'edit a set of metadata for a zone'),
+    'delete-metadata': ('metadata', 'METADATA', 'delete all metadata of a given kind for a zone'),
+    'list-cryptokeys': ('cryptokey', 'CRYPTOKEY', 'list all cryptokeys from a zone'),
+    'show-cryptokey': ('cryptokey', 'CRYPTOKEY', 'show a cryptokey from a zone'),
+    'add-cryptokey': ('cryptokey', 'CRYPTOKEY', 'add a new cryptokey to a zone'),
+    'edit-cryptokey': ('cryptokey', 'CRYPTOKEY', 'edit a cryptokey from a zone'),
+    'delete-cryptokey': ('cryptokey', 'CRYPTOKEY', 'delete a cryptokey from a zone'),
+    'search': ('search', 'SEARCH', 'search across all zones, records and comments'),
+    'search-log': ('search', 'SEARCH', 'search in the log'),
+    'statistics': ('statistics', 'STATISTICS', 'show internal statistics'),
+    'flush-cache': ('cache', 'CACHE', 'flush the cache for a given domain name'),
+    'inventory': ('inventory', 'INVENTORY', 'list the cryptokeys and metadata of every zone'),
+    'snapshot': ('snapshot', 'SNAPSHOT', 'save every zone of a server to compressed files'),
+    'compare-zone': ('compare', 'COMPARE', 'compare zones across servers and show the RRsets that differ'),
+    'sync': ('sync', 'SYNC', 'make a zone match a local zone file with as few changes as possible'),
+}
+
+
+def load_command(action):
+    """
+    Import the module implementing an action and return its command class.
+    """
+    modulename, klassname, _ = ACTIONS[action]
+    module = importlib.import_module('.' + modulename, __name__)
+    return getattr(module, klassname)
+
+
+def add_action_parser(subparsers, action, **kwargs):
+    """
+    Add the subparser of an action, with its help text from ACTIONS.
+    """
+    return subparsers.add_parser(action, help=ACTIONS[action][2], **kwargs)
+
+
+def add_target_arguments(parser, action):
+    """
+    Add the --servers and --urls options of actions that can run against
+    several servers at once, see PDNSCommand.server_targets.
+    """
+    parser.add_argument('--servers', dest='server_ids', metavar='ID,...',
+                        help='comma separated server IDs to {} concurrently instead of --server'.format(action))
+    parser.add_argument('--urls', metavar='URL,...',
+                        help='comma separated API URLs to {} concurrently with the same credentials'.format(action))
+
+
+def add_endpoint_arguments(parser):
+    """
+    Add the --targets option of write actions, run against every endpoint of
+    the given groups concurrently by the pdns script.
+    """
+    parser.add_argument('--targets', metavar='GROUP,...',
+                        help='run against every endpoint of these comma separated groups (or endpoint names) of '
+                             'the config file concurrently, instead of --url and --server')
+
+
 class PDNSCommandException(Exception):
     pass
 
@@ -24,7 +99,6 @@ class PDNSCommand(object):
 
     NAME = '__setme__'
     DESCRIPTION = '__setme__'
-    COMMANDS = []
 
     @classmethod
     def name(cls):
@@ -69,11 +143,38 @@ class PDNSCommand(object):
         """
         pass
 
+    def server_targets(self):
+        """
+        Return (label, server) pairs for every server ID in --servers and API
+        URL in --urls, defaulting to --server on the current API. The label
+        identifies the target in output and only holds what differs.
+        """
+        if self.args.server_ids:
+            server_ids = [server_id.strip() for server_id in self.args.server_ids.split(',') if server_id.strip()]
+        else:
+            server_ids = [self.args.server]
+        if self.args.urls:
+            apis = [self.api.for_url(url.strip()) for url in self.args.urls.split(',') if url.strip()]
+        else:
+            apis = [self.api]
+
+        targets = []
+        for api in apis:
+            for server_id in server_ids:
+                if len(apis) > 1 and len(server_ids) > 1:
+                    label = '{} {}'.format(api.url, server_id)
+                else:
+                    label = api.url if len(apis) > 1 else server_id
+                targets.append((label, api.server(server_id)))
+            api.reserve_connections(len(server_ids))
+        return targets
+
     def pretty_print(self, msg, *args, **kwargs):
         """
         Format and print messages on stdout, print arguments in bold if in a tty.
         """
         if sys.stdout.isatty():
+            import colored
             pretty_args = [colored.stylize(arg, colored.attr('bold')) for arg in args]
             pretty_kwargs = {key: colored.stylize(arg, colored.attr('bold')) for key, arg in kwargs.items()}
             print(msg.format(*pretty_args, **pretty_kwargs))
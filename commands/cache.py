@@ -1,12 +1,113 @@
-from . import PDNSCommand
+from . import PDNSCommand, add_action_parser
+from throttle import run_concurrently
+import sys
+import time
+
+
+def normalize_name(name):
+    """
+    Lowercase a name and make it absolute, keeping a trailing $.
+    """
+    name = name.strip().lower()
+    subtree = name.endswith('$')
+    if subtree:
+        name = name[:-1]
+    if not name.endswith('.'):
+        name += '.'
+    return name + '$' if subtree else name
+
+
+def parent_names(name):
+    """
+    Yield the names above an absolute name, up to the root.
+    """
+    while name != '.':
+        name = name.split('.', 1)[1] or '.'
+        yield name
+
+
+def collapse_names(names):
+    """
+    Return the names to flush, without duplicates and without those covered
+    by a name flushed with $ (itself and everything below it), sorted so
+    names of the same zone are next to each other.
+    """
+    names = set(names)
+    subtrees = {name[:-1] for name in names if name.endswith('$')}
+    flush = []
+    for name in names:
+        base = name[:-1] if name.endswith('$') else name
+        if base in subtrees and not name.endswith('$'):
+            continue
+        if any(parent in subtrees for parent in parent_names(base)):
+            continue
+        flush.append(name)
+    return sorted(flush, key=lambda name: name.rstrip('$').split('.')[::-1])
+
+
 class CACHE(PDNSCommand):
     NAME = 'cache'
     DESCRIPTION = 'cache related API actions'
-    COMMANDS = ['flush-cache']
 
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
-        subparsers.add_parser('flush-cache', help='flush the cache for a given domain name')
+        flush_cache = add_action_parser(subparsers, 'flush-cache')
+        flush_cache.add_argument('domain', nargs='*',
+                                 help='domain names to flush, a trailing $ also flushes every name below')
+        flush_cache.add_argument('--file', action='append', default=[], metavar='FILE',
+                                 help='also flush the names in FILE, one per line (- for stdin, repeatable)')
+        flush_cache.add_argument('--zone', action='append', default=[], metavar='ZONE',
+                                 help='also flush every owner name in ZONE (repeatable)')
+        flush_cache.add_argument('--subtree', action='store_true',
+                                 help='flush every given name with everything below it, as if it ended with $')
+        flush_cache.add_argument('--workers', type=int, default=8, help='requests sent concurrently (default: 8)')
+        flush_cache.add_argument('--rate', type=float, help='maximum requests per second')
 
     def run(self):
-        self.fail('This command is not yet implemented')
+        getattr(self, (self.args.action).replace('-', '_'))()
+
+    def read_names(self, server):
+        names = list(self.args.domain)
+        for path in self.args.file:
+            if path == '-':
+                names.extend(sys.stdin)
+            else:
+                with open(path) as names_file:
+                    names.extend(names_file)
+        for zone_id in self.args.zone:
+            zone = server.zone(zone_id)
+            names.extend(rrset.name for rrset in zone.iter_rrsets())
+
+        names = [normalize_name(name) for name in names if name.strip() and not name.lstrip().startswith('#')]
+        if self.args.subtree:
+            names = [name if name.endswith('$') else name + '$' for name in names]
+        return names
+
+    def flush_cache(self):
+        """
+        Flush every name with one request each, sent concurrently. Duplicate
+        names and names below one flushed with $ are only covered once.
+        """
+        server = self.api.server(self.args.server)
+        names = self.read_names(server)
+        if not names:
+            self.fail('no domain names to flush given')
+
+        flush = collapse_names(names)
+        self.api.reserve_connections(self.args.workers)
+
+        start = time.monotonic()
+        entries = failed = 0
+        for name, result, exception in run_concurrently(server.flush_cache, flush, workers=self.args.workers,
+                                                        rate=self.args.rate):
+            if exception is not None:
+                print('{}: {}'.format(name, exception), file=sys.stderr)
+                failed += 1
+                continue
+            entries += result.get('count', 0)
+            print('{}: {} entries flushed'.format(name, result.get('count', 0)))
+
+        print('{} names flushed with {} requests, {} cache entries removed, {} failed in {:.1f}s'.format(
+            len(set(names)), len(flush), entries, failed, time.monotonic() - start))
+        if failed:
+            self.fail('{} of {} flush requests failed', failed, len(flush))
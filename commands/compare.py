@@ -0,0 +1,177 @@
+from . import PDNSCommand, add_action_parser, add_endpoint_arguments, add_target_arguments
+from throttle import run_concurrently
+import sys
+import time
+
+
+def normalize_zone(name):
+    """
+    Lowercase a zone name and make it absolute.
+    """
+    name = name.strip().lower()
+    return name if name.endswith('.') else name + '.'
+
+
+def short_digest(digest):
+    return '-' if digest is None else digest.hex()[:8]
+
+
+def differing_rrsets(digests):
+    """
+    Yield the (name, type) keys of the RRsets whose digest is not the same
+    on every target, digests being one {(name, type): digest} dict per
+    target, sorted by name and type.
+    """
+    keys = set()
+    for target_digests in digests:
+        keys.update(target_digests)
+    for key in sorted(keys, key=lambda key: (key[0].split('.')[::-1], key[1])):
+        values = {target_digests.get(key) for target_digests in digests}
+        if len(values) > 1:
+            yield key
+
+
+class COMPARE(PDNSCommand):
+    NAME = 'compare'
+    DESCRIPTION = 'zone comparison related API actions'
+
+    @classmethod
+    def init_parser(cls, subparsers, zone_parser):
+        compare_zone = add_action_parser(subparsers, 'compare-zone')
+        compare_zone.add_argument('zone', nargs='*', help='zones to compare')
+        compare_zone.add_argument('--file', action='append', default=[], metavar='FILE',
+                                  help='also compare the zones in FILE, one per line (- for stdin, repeatable)')
+        compare_zone.add_argument('--all', action='store_true', help='compare every zone found on any target')
+        compare_zone.add_argument('--serial-only', action='store_true',
+                                  help='only fetch the RRsets of zones whose serials differ between targets')
+        add_target_arguments(compare_zone, 'compare')
+        add_endpoint_arguments(compare_zone)
+        compare_zone.add_argument('--workers', type=int, default=8,
+                                  help='zones fetched concurrently (default: 8)')
+        compare_zone.add_argument('--rate', type=float, help='maximum zones fetched per second')
+
+    def run(self):
+        getattr(self, (self.args.action).replace('-', '_'))()
+
+    def read_zones(self):
+        zones = list(self.args.zone)
+        for path in self.args.file:
+            if path == '-':
+                zones.extend(sys.stdin)
+            else:
+                with open(path) as zones_file:
+                    zones.extend(zones_file)
+        zones = [normalize_zone(zone) for zone in zones if zone.strip() and not zone.lstrip().startswith('#')]
+        return list(dict.fromkeys(zones))
+
+    def list_serials(self, targets, workers):
+        """
+        Return {zone: serial} for every target, from one streamed listing
+        each, fetched concurrently.
+        """
+        def serials(index):
+            server = targets[index][1]
+            return {normalize_zone(zone.info['id']): zone.info.get('serial') for zone in server.iter_zones()}
+
+        listings = [None] * len(targets)
+        for index, result, exception in run_concurrently(serials, range(len(targets)), workers=workers):
+            if exception is not None:
+                self.fail('{}: could not list zones: {}', targets[index][0], exception)
+            listings[index] = result
+        return listings
+
+    def compare_zone(self):
+        """
+        Compare zones on every target: zones are first matched by serial with
+        one listing per target, then the RRsets of each zone are fetched from
+        every target concurrently and reduced to a digest per RRset, so only
+        the digests of the zones in flight are held. The RRsets that differ
+        are printed with the digest found on each target, - where missing.
+
+        Targets are the --targets endpoints, each with its own URL, server
+        and credentials, or the --servers and --urls combinations.
+        """
+        if self.args.targets:
+            if self.args.server_ids or self.args.urls:
+                self.fail('give either --targets or --servers/--urls')
+            targets = self.args.endpoints
+        else:
+            targets = self.server_targets()
+        if len(targets) < 2:
+            self.fail('give at least two targets to compare with --targets, --servers or --urls')
+        zones = self.read_zones()
+        if not zones and not self.args.all:
+            self.fail('no zones to compare given')
+
+        start = time.monotonic()
+        listings = self.list_serials(targets, len(targets))
+        if self.args.all:
+            zones = list(dict.fromkeys(zones + sorted(set().union(*listings))))
+
+        rows = []
+        compare = []
+        unknown = []
+        in_sync = by_serial = 0
+        for zone in zones:
+            serials = [listing.get(zone) for listing in listings]
+            missing = [zone not in listing for listing in listings]
+            if all(missing):
+                print('{}: not found on any target'.format(zone), file=sys.stderr)
+                unknown.append(zone)
+            elif any(missing):
+                rows.append([zone, zone, '*'] + ['-' if absent else str(serial)
+                                                 for absent, serial in zip(missing, serials)])
+            elif self.args.serial_only and len(set(serials)) == 1:
+                in_sync += 1
+                by_serial += 1
+            else:
+                compare.append(zone)
+
+        for api in {id(server.api): server.api for _, server in targets}.values():
+            api.reserve_connections(self.args.workers)
+
+        def fetch(item):
+            zone, index = item
+            digests = {}
+            for rrset in targets[index][1].zone(zone).iter_rrsets():
+                digests[(rrset.name.lower(), rrset.type)] = rrset.digest()
+            return digests
+
+        fetched = {}
+        failed = set()
+        items = ((zone, index) for zone in compare for index in range(len(targets)))
+        for (zone, index), digests, exception in run_concurrently(fetch, items, workers=self.args.workers,
+                                                                  rate=self.args.rate):
+            if exception is not None:
+                print('{} on {}: {}'.format(zone, targets[index][0], exception), file=sys.stderr)
+                failed.add(zone)
+            results, remaining = fetched.setdefault(zone, ([None] * len(targets), [len(targets)]))
+            results[index] = digests
+            remaining[0] -= 1
+            if remaining[0]:
+                continue
+
+            del fetched[zone]
+            if zone in failed:
+                continue
+            differing = False
+            for name, type in differing_rrsets(results):
+                differing = True
+                rows.append([zone, name, type] + [short_digest(result.get((name, type))) for result in results])
+            in_sync += not differing
+
+        if rows:
+            print('\t'.join(['zone', 'name', 'type'] + [label for label, _ in targets]))
+            for row in sorted(rows, key=lambda row: row[0].split('.')[::-1]):
+                print('\t'.join(row))
+
+        differ = len({row[0] for row in rows})
+        print('{} zones compared, {} in sync ({} by serial), {} differ, {} not found, {} failed in {:.1f}s'.format(
+            len(zones), in_sync, by_serial, differ, len(unknown), len(failed), time.monotonic() - start),
+            file=sys.stderr)
+        if unknown:
+            self.fail('{} of {} zones not found on any target', len(unknown), len(zones))
+        if failed:
+            self.fail('{} of {} zones could not be fetched from every target', len(failed), len(zones))
+        if differ:
+            self.fail('{} of {} zones differ between targets', differ, len(zones))
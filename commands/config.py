@@ -1,29 +1,203 @@
-from . import PDNSCommand
+from . import PDNSCommand, add_action_parser, add_endpoint_arguments
+from fnmatch import fnmatchcase
+from throttle import RateLimiter, run_concurrently
+import csv
+import io
+import json
+import sys
+import time
+
+# zone kinds that can be retrieved from a master
+SECONDARY_KINDS = ('slave', 'secondary', 'consumer')
+
+
+def add_zone_selection_arguments(parser, action):
+    """
+    Add the zone list and selection options of actions run on many zones at
+    once, see CONFIG.select_zones.
+    """
+    parser.add_argument('zone', nargs='*', help='zone IDs')
+    parser.add_argument('--zones-file', action='append', default=[], metavar='FILE',
+                        help='also {} the zones in FILE, one per line (- for stdin, repeatable)'.format(action))
+    parser.add_argument('--glob', action='append', default=[], metavar='PATTERN',
+                        help='also {} every zone matching PATTERN, e.g. \'*.example.org.\' (repeatable)'.format(action))
+    parser.add_argument('--changed-since', type=int, metavar='SERIAL',
+                        help='also {} every zone with a serial above SERIAL, only those matching --glob if '
+                             'given'.format(action))
+    parser.add_argument('--workers', type=int, default=8, help='requests sent concurrently (default: 8)')
+    parser.add_argument('--rate', type=float, help='maximum requests per second to the server')
+
+
+def interleave(groups):
+    """
+    Yield one item of every group in turn until all are exhausted.
+    """
+    iterators = [iter(group) for group in groups]
+    while iterators:
+        for iterator in list(iterators):
+            try:
+                yield next(iterator)
+            except StopIteration:
+                iterators.remove(iterator)
+
+
 class CONFIG(PDNSCommand):
     NAME = 'config'
     DESCRIPTION = 'config related API actions'
-    COMMANDS = ['list-config', 'notify', 'axfr-retrieve', 'export', 'check']
 
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
         # configs
-        subparsers.add_parser('list-config', help='list config settings')
+        add_action_parser(subparsers, 'list-config')
 
-        subparsers.add_parser('notify', parents=[zone_parser], help='send a DNS NOTIFY to all slaves for a zone')
+        notify = add_action_parser(subparsers, 'notify')
+        add_zone_selection_arguments(notify, 'notify')
+        add_endpoint_arguments(notify)
 
-        subparsers.add_parser('axfr-retrieve', parents=[zone_parser], help='retrieve a zone from the master')
+        axfr_retrieve = add_action_parser(subparsers, 'axfr-retrieve')
+        add_zone_selection_arguments(axfr_retrieve, 'retrieve')
+        axfr_retrieve.add_argument('--primary-rate', type=float,
+                                   help='maximum retrievals per second from each master')
 
-        subparsers.add_parser('export', parents=[zone_parser], help='export a zone in AXFR format')
+        export = add_action_parser(subparsers, 'export', parents=[zone_parser])
+        export.add_argument('--format', choices=('zone', 'json', 'ndjson', 'csv'), default='zone',
+                            help='zone: AXFR/BIND text from the server, json: the API representation, '
+                                 'ndjson: one RRset per line, csv: one record per line (default: zone)')
+        export.add_argument('-o', '--output', help='write to this file instead of stdout')
 
-        subparsers.add_parser('check', parents=[zone_parser], help='verify a zone content/configuration')
+        add_action_parser(subparsers, 'check', parents=[zone_parser])
 
     def run(self):
-        if self.args.action == 'notify':
+        if self.args.action in ('notify', 'axfr-retrieve', 'export'):
             getattr(self, (self.args.action).replace('-', '_'))()
         else:
             self.fail('This command is not yet implemented')
 
+    def select_zones(self, server, secondary_only=False):
+        """
+        Return {zone ID: masters} for the given zones, without duplicates,
+        and the zones of one listing matching --glob and --changed-since.
+        With secondary_only, zones selected from the listing that are not
+        slaves are left out. The listing is only fetched when needed.
+        """
+        zones = list(self.args.zone)
+        for path in self.args.zones_file:
+            if path == '-':
+                zones.extend(sys.stdin)
+            else:
+                with open(path) as zones_file:
+                    zones.extend(zones_file)
+        zones = dict.fromkeys((zone.strip() for zone in zones
+                               if zone.strip() and not zone.lstrip().startswith('#')), ())
+
+        globs = [pattern.lower() for pattern in self.args.glob]
+        since = self.args.changed_since
+        with_masters = getattr(self.args, 'primary_rate', None) is not None
+        if not globs and since is None and not with_masters:
+            return zones
+
+        for zone in server.iter_zones():
+            info = zone.info
+            zone_id = info['id']
+            if zone_id in zones:
+                zones[zone_id] = tuple(info.get('masters') or ())
+                continue
+            if not globs and since is None:
+                continue
+            if globs and not any(fnmatchcase(zone_id.lower(), pattern) for pattern in globs):
+                continue
+            if since is not None and (info.get('serial') or 0) <= since:
+                continue
+            if secondary_only and (info.get('kind') or '').lower() not in SECONDARY_KINDS:
+                continue
+            zones[zone_id] = tuple(info.get('masters') or ())
+        return zones
+
+    def run_zones(self, verb, method, secondary_only=False):
+        """
+        Call a Zone method on every selected zone concurrently, up to
+        --workers at a time and --rate per second. With --primary-rate,
+        zones are interleaved by their first master, each master limited
+        to that many calls per second.
+        """
+        server = self.api.server(self.args.server)
+        zones = self.select_zones(server, secondary_only)
+        if not zones:
+            self.fail('no zones to {} given or matched', verb)
+
+        primary_rate = getattr(self.args, 'primary_rate', None)
+        by_primary = {}
+        for zone_id, masters in zones.items():
+            by_primary.setdefault(masters[0] if masters else None, []).append(zone_id)
+        limiters = {primary: RateLimiter(primary_rate) for primary in by_primary}
+        primaries = {zone_id: masters[0] if masters else None for zone_id, masters in zones.items()}
+
+        def call(zone_id):
+            limiters[primaries[zone_id]].wait()
+            return getattr(server.zone(zone_id), method)()
+
+        self.api.reserve_connections(self.args.workers)
+        start = time.monotonic()
+        failed = 0
+        for zone_id, result, exception in run_concurrently(call, interleave(by_primary.values()),
+                                                           workers=self.args.workers, rate=self.args.rate):
+            if exception is not None:
+                print('{}: {}'.format(zone_id, exception), file=sys.stderr)
+                failed += 1
+                continue
+            print('{}: {}'.format(zone_id, (result or {}).get('result', 'ok')))
+
+        if len(zones) > 1:
+            print('{} zones, {} failed in {:.1f}s'.format(len(zones), failed, time.monotonic() - start),
+                  file=sys.stderr)
+        if failed:
+            self.fail('{} of {} zones failed', failed, len(zones))
+
     def notify(self):
+        self.run_zones('notify', 'notify')
+
+    def axfr_retrieve(self):
+        self.run_zones('retrieve', 'axfr_retrieve', secondary_only=True)
+
+    def export(self):
+        """
+        Stream the zone to the output as it is downloaded, never holding more
+        than one chunk (or one RRset for ndjson/csv) in memory.
+        """
         server = self.api.server(self.args.server)
         zone = server.zone(self.args.zone)
-        zone.notify()
+
+        output = open(self.args.output, 'wb') if self.args.output else sys.stdout.buffer
+        try:
+            if self.args.format == 'zone':
+                zone.export(output)
+            elif self.args.format == 'json':
+                zone.save(output)
+            else:
+                text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+                if self.args.format == 'ndjson':
+                    self._export_ndjson(zone, text)
+                else:
+                    self._export_csv(zone, text)
+                text.flush()
+                text.detach()
+        finally:
+            if self.args.output:
+                output.close()
+
+    def _export_ndjson(self, zone, output):
+        for rrset in zone.iter_rrsets():
+            output.write(json.dumps({
+                'name': rrset.name,
+                'type': rrset.type,
+                'ttl': rrset.ttl,
+                'records': [{'content': record.content, 'disabled': record.disabled} for record in rrset.records],
+                'comments': [comment.to_dict() for comment in rrset.comments],
+            }, separators=(',', ':')) + '\n')
+
+    def _export_csv(self, zone, output):
+        writer = csv.writer(output)
+        writer.writerow(['name', 'ttl', 'type', 'content', 'disabled'])
+        for rrset in zone.iter_rrsets():
+            for record in rrset.records:
+                writer.writerow([rrset.name, rrset.ttl, rrset.type, record.content, record.disabled])
@@ -1,22 +1,60 @@
-from . import PDNSCommand
+from . import PDNSCommand, add_action_parser
+from operator import attrgetter
 class CRYPTOKEY(PDNSCommand):
     NAME = 'cryptokey'
     DESCRIPTION = 'cryptokey related API actions'
-    COMMANDS = ['list-cryptokeys', 'show-cryptokey', 'edit-cryptokey', 'add-cryptokey', 'delete-cryptokey']
 
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
         # cryptokeys
 
-        subparsers.add_parser('list-cryptokeys', help='list all cryptokeys from a zone')
+        add_action_parser(subparsers, 'list-cryptokeys', parents=[zone_parser])
 
-        subparsers.add_parser('show-cryptokey', help='show a cryptokey from a zone')
+        show_cryptokey = add_action_parser(subparsers, 'show-cryptokey', parents=[zone_parser])
+        show_cryptokey.add_argument('id', type=int, help='cryptokey ID')
+        show_cryptokey.add_argument('--private-key', action='store_true', help='also show the private key')
 
-        subparsers.add_parser('add-cryptokey', help='add a new cryptokey to a zone')
+        add_action_parser(subparsers, 'add-cryptokey')
 
-        subparsers.add_parser('edit-cryptokey', help='edit a cryptokey from a zone')
+        add_action_parser(subparsers, 'edit-cryptokey')
 
-        subparsers.add_parser('delete-cryptokey', help='delete a cryptokey from a zone')
+        add_action_parser(subparsers, 'delete-cryptokey')
 
     def run(self):
-        self.fail('This command is not yet implemented')
+        if self.args.action in ('list-cryptokeys', 'show-cryptokey'):
+            getattr(self, (self.args.action).replace('-', '_'))()
+        else:
+            self.fail('This command is not yet implemented')
+
+    def list_cryptokeys(self):
+        server = self.api.server(self.args.server)
+        zone = server.zone(self.args.zone)
+
+        for cryptokey in sorted(zone.cryptokeys, key=attrgetter('id')):
+            print(format_cryptokey(cryptokey.data))
+
+    def show_cryptokey(self):
+        server = self.api.server(self.args.server)
+        cryptokey = server.zone(self.args.zone).cryptokey(self.args.id)
+
+        for key, value in sorted(cryptokey.data.items()):
+            if key == 'type' or (key == 'privatekey' and not self.args.private_key):
+                continue
+            if isinstance(value, list):
+                value = ', '.join(value)
+            print('{}: {}'.format(key, value))
+
+
+def key_state(data):
+    state = 'active' if data.get('active') else 'inactive'
+    if not data.get('published', True):
+        state += ',unpublished'
+    return state
+
+
+def format_cryptokey(data):
+    """
+    One line summary of a cryptokey: ID, key type, algorithm, bits and state.
+    """
+    return '{}\t{}\t{}\t{}\t{}'.format(data['id'], data.get('keytype', ''), data.get('algorithm', ''),
+                                       data.get('bits', ''), key_state(data))
@@ -0,0 +1,123 @@
+from . import PDNSCommand, add_action_parser
+from .cryptokey import key_state
+from throttle import run_concurrently
+import json
+import sys
+import time
+
+# metadata kinds shown by default, those relevant to key rollovers and transfers
+INVENTORY_METADATA = ('SOA-EDIT', 'PRESIGNED', 'ALLOW-AXFR-FROM')
+
+
+def format_keys(cryptokeys):
+    """
+    The cryptokeys of a zone in one column: id/keytype/algorithm/state for each.
+    """
+    keys = []
+    for cryptokey in sorted(cryptokeys, key=lambda cryptokey: cryptokey['id']):
+        keys.append('{}/{}/{}/{}'.format(cryptokey['id'], cryptokey.get('keytype', ''),
+                                         cryptokey.get('algorithm', ''), key_state(cryptokey)))
+    return ' '.join(keys)
+
+
+class INVENTORY(PDNSCommand):
+    NAME = 'inventory'
+    DESCRIPTION = 'DNSSEC inventory related API actions'
+
+    @classmethod
+    def init_parser(cls, subparsers, zone_parser):
+        inventory = add_action_parser(subparsers, 'inventory')
+        inventory.add_argument('--metadata', metavar='KIND,...', default=','.join(INVENTORY_METADATA),
+                               help='comma separated metadata kinds to show, or all '
+                                    '(default: {})'.format(','.join(INVENTORY_METADATA)))
+        inventory.add_argument('--format', choices=('table', 'ndjson'), default='table',
+                               help='table: one tab separated line per zone, sorted, '
+                                    'ndjson: one JSON object per zone as it is fetched (default: table)')
+        inventory.add_argument('--workers', type=int, default=16, help='zones fetched concurrently (default: 16)')
+        inventory.add_argument('--rate', type=float, help='maximum zones fetched per second')
+        inventory.add_argument('--cached', action='store_true',
+                               help='reuse the cached keys and metadata of zones whose serials and DNSSEC state '
+                                    'are unchanged, missing key state and metadata changes')
+
+    def run(self):
+        getattr(self, (self.args.action).replace('-', '_'))()
+
+    def collect(self, zone):
+        """
+        Return the inventory entry of a zone from the listing data, its
+        cryptokeys (only asked for when the zone has DNSSEC) and all its
+        metadata, and whether it came from the zone cache.
+
+        Entries are always cached, but only reused with --cached, while the
+        zone's serials and DNSSEC state are unchanged: activating a key or
+        editing metadata changes neither.
+        """
+        info = zone.info
+        cache = self.api.cache
+        key = zone.cache_key + ['inventory']
+        validator = [info.get('serial'), info.get('edited_serial'), info.get('dnssec')]
+        if self.args.cached and cache is not None and cache.lookups:
+            entry = cache.get(key, validator=validator)
+            if entry is not None:
+                return entry, True
+
+        entry = {
+            'zone': zone.id,
+            'kind': info.get('kind'),
+            'serial': info.get('serial'),
+            'dnssec': info.get('dnssec', False),
+            'cryptokeys': [cryptokey.data for cryptokey in zone.cryptokeys] if info.get('dnssec') else [],
+            'metadata': {metadata.id: metadata.data['metadata'] for metadata in zone.metadata},
+        }
+        if cache is not None:
+            cache.put(key, entry, validator=validator)
+        return entry, False
+
+    def inventory(self):
+        """
+        Fetch the cryptokeys and metadata of every zone of one listing
+        concurrently, up to two requests per zone.
+        """
+        server = self.api.server(self.args.server)
+        kinds = None if self.args.metadata == 'all' else [
+            kind.strip() for kind in self.args.metadata.split(',') if kind.strip()]
+
+        start = time.monotonic()
+        zones = server.zones
+        self.api.reserve_connections(self.args.workers)
+
+        entries = []
+        cached = failed = 0
+        for zone, result, exception in run_concurrently(self.collect, zones, workers=self.args.workers,
+                                                        rate=self.args.rate):
+            if exception is not None:
+                print('{}: {}'.format(zone.id, exception), file=sys.stderr)
+                failed += 1
+                continue
+            entry, from_cache = result
+            cached += from_cache
+            if kinds is not None:
+                entry = dict(entry, metadata={kind: values for kind, values in entry['metadata'].items()
+                                              if kind in kinds})
+            if self.args.format == 'ndjson':
+                print(json.dumps(entry), flush=True)
+            else:
+                entries.append(entry)
+
+        if self.args.format == 'table':
+            self.print_table(entries, kinds)
+
+        print('{} zones, {} unchanged from the cache, {} failed in {:.1f}s'.format(
+            len(zones) - failed, cached, failed, time.monotonic() - start), file=sys.stderr)
+        if failed:
+            self.fail('{} of {} zones could not be fetched', failed, len(zones))
+
+    def print_table(self, entries, kinds):
+        if kinds is None:
+            kinds = sorted({kind for entry in entries for kind in entry['metadata']})
+        print('\t'.join(['zone', 'kind', 'serial', 'dnssec', 'cryptokeys'] + kinds))
+        for entry in sorted(entries, key=lambda entry: entry['zone']):
+            metadata = entry['metadata']
+            print('\t'.join([entry['zone'], entry['kind'] or '', str(entry['serial']),
+                             'yes' if entry['dnssec'] else 'no', format_keys(entry['cryptokeys'])]
+                            + [','.join(metadata.get(kind, [])) for kind in kinds]))
@@ -1,21 +1,39 @@
-from . import PDNSCommand
+from . import PDNSCommand, add_action_parser
+from operator import attrgetter
 class METADATA(PDNSCommand):
     NAME = 'metadata'
     DESCRIPTION = 'metadata related API actions'
-    COMMANDS = ['list-metadata', 'show-metadata', 'edit-metadata', 'add-metadata', 'delete-metadata']
 
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
         # metadata
-        subparsers.add_parser('list-metadata', help='list all metadata for a zone')
+        add_action_parser(subparsers, 'list-metadata', parents=[zone_parser])
 
-        subparsers.add_parser('show-metadata', help='show metadata of a given kind for a zone')
+        show_metadata = add_action_parser(subparsers, 'show-metadata', parents=[zone_parser])
+        show_metadata.add_argument('kind', help='metadata kind, e.g. SOA-EDIT')
 
-        subparsers.add_parser('add-metadata', help='add a new set of metadata for a zone')
+        add_action_parser(subparsers, 'add-metadata')
 
-        subparsers.add_parser('edit-metadata', help='edit a set of metadata for a zone')
+        add_action_parser(subparsers, 'edit-metadata')
 
-        subparsers.add_parser('delete-metadata', help='delete all metadata of a given kind for a zone')
+        add_action_parser(subparsers, 'delete-metadata')
 
     def run(self):
-        self.fail('This command is not yet implemented')
+        if self.args.action in ('list-metadata', 'show-metadata'):
+            getattr(self, (self.args.action).replace('-', '_'))()
+        else:
+            self.fail('This command is not yet implemented')
+
+    def list_metadata(self):
+        server = self.api.server(self.args.server)
+        zone = server.zone(self.args.zone)
+
+        for metadata in sorted(zone.metadata, key=attrgetter('id')):
+            print('{}: {}'.format(metadata.id, ', '.join(metadata.data['metadata'])))
+
+    def show_metadata(self):
+        server = self.api.server(self.args.server)
+        metadata = server.zone(self.args.zone).metadata_entry(self.args.kind)
+
+        for value in metadata.data['metadata']:
+            print(value)
@@ -1,21 +1,27 @@
-from . import PDNSCommand
+from . import PDNSCommand, add_action_parser, add_endpoint_arguments
+from changes import ChangeError, apply_changes, read_changes
 from datetime import datetime
 from models import RRset,Record,Comment
+from fnmatch import fnmatchcase
 from operator import attrgetter
+from tabular import guess_format, open_input
+import re
+import sys
 import time
 
 class RRSET(PDNSCommand):
     NAME = 'rrset'
     DESCRIPTION = 'RRset related API actions'
-    COMMANDS = ['show-rrsets', 'edit-rrset', 'delete-rrset', 'edit-rrset-comments']
 
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
 
-        subparsers.add_parser('show-rrsets', parents=[zone_parser], help='show Resource Record sets for a zone')
+        show_rrsets = add_action_parser(subparsers, 'show-rrsets', parents=[zone_parser])
+        show_rrsets.add_argument('--unsorted', action='store_true',
+                                 help='print RRsets in server order while the zone is downloading, '
+                                      'using little memory on very large zones')
 
-        edit_rrset = subparsers.add_parser('edit-rrset', parents=[zone_parser],
-                                           help='add/replace/delete a record in Resource Record set')
+        edit_rrset = add_action_parser(subparsers, 'edit-rrset', parents=[zone_parser])
         edit_rrset_mode = edit_rrset.add_mutually_exclusive_group(required=True)
         edit_rrset_mode.add_argument('--add', action='store_const', dest='mode', const='add',
                                      help='add a record for a domain/subdomain')
@@ -29,14 +35,14 @@ class RRSET(PDNSCommand):
         edit_rrset.add_argument('name', help='record name')
         edit_rrset.add_argument('type', help='record type')
         edit_rrset.add_argument('content', help='record content')
+        add_endpoint_arguments(edit_rrset)
 
-        delete_rrset = subparsers.add_parser('delete-rrset', parents=[zone_parser],
-                                             help='delete a Resource Record set')
+        delete_rrset = add_action_parser(subparsers, 'delete-rrset', parents=[zone_parser])
         delete_rrset.add_argument('name', help='record name')
         delete_rrset.add_argument('type', help='record type')
+        add_endpoint_arguments(delete_rrset)
 
-        edit_rrset_comments = subparsers.add_parser('edit-rrset-comments', parents=[zone_parser],
-                                                    help='add/replace/delete a comment in Resource Record set')
+        edit_rrset_comments = add_action_parser(subparsers, 'edit-rrset-comments', parents=[zone_parser])
         edit_rrset_comments_mode = edit_rrset_comments.add_mutually_exclusive_group(required=True)
         edit_rrset_comments_mode.add_argument('--add', action='store_const', dest='mode', const='add',
                                               help='add a comment for a domain/subdomain')
@@ -49,6 +55,22 @@ class RRSET(PDNSCommand):
         edit_rrset_comments.add_argument('type', help='record type')
         edit_rrset_comments.add_argument('content', help='record content')
 
+        apply = add_action_parser(subparsers, 'apply')
+        apply.add_argument('--zone', help='zone ID for changes that do not name one')
+        apply.add_argument('--format', choices=('jsonl', 'csv'),
+                           help='change file format (default: guessed from the file name, else jsonl)')
+        apply.add_argument('file', nargs='?', default='-',
+                           help='change file with zone, mode, name, type, content, ttl, disabled and set_ptr '
+                                'fields (default: stdin)')
+
+        set_ttl = add_action_parser(subparsers, 'set-ttl', parents=[zone_parser])
+        set_ttl.add_argument('--ttl', type=int, required=True, help='new TTL')
+        set_ttl.add_argument('--name', metavar='PATTERN', help='only RRsets whose name matches this regex')
+        set_ttl.add_argument('--glob', action='store_true', help='match --name as a glob instead of a regex')
+        set_ttl.add_argument('--type', dest='types', nargs='+', metavar='TYPE', help='only RRsets of these types')
+        set_ttl.add_argument('--exclude-type', dest='exclude_types', nargs='+', default=[], metavar='TYPE',
+                             help='skip RRsets of these types')
+        set_ttl.add_argument('--dry-run', action='store_true', help='print the changes without applying them')
 
     def run(self):
         getattr(self, (self.args.action).replace('-', '_'))()
@@ -57,15 +79,23 @@ class RRSET(PDNSCommand):
         server = self.api.server(self.args.server)
         zone = server.zone(self.args.zone)
 
-        # base domain first
-        for rrset in sorted([rrset for rrset in zone.rrsets if rrset.name == zone.data['name']],
-                            key=attrgetter('name', 'type')):
-            self._print_rrset(rrset)
+        if self.args.unsorted:
+            for rrset in zone.iter_rrsets():
+                self._print_rrset(rrset)
+            return
 
-        # subdomains next
-        for rrset in sorted([rrset for rrset in zone.rrsets if rrset.name != zone.data['name']],
-                            key=attrgetter('name', 'type')):
-            self._print_rrset(rrset)
+        rrsets = zone.rrsets
+        apex = zone.data['name']
+
+        with self.api.span('output'):
+            # base domain first
+            for rrset in sorted(rrsets.by_name(apex), key=attrgetter('type')):
+                self._print_rrset(rrset)
+
+            # subdomains next
+            for rrset in sorted([rrset for rrset in rrsets if rrset.name != apex],
+                                key=attrgetter('name', 'type')):
+                self._print_rrset(rrset)
 
     def _print_rrset(self, rrset):
         for comment in sorted(rrset.comments, key=attrgetter('modified_at')):
@@ -88,19 +118,19 @@ class RRSET(PDNSCommand):
 
         name = self.args.name
         if not name.endswith('.'):
-            name = '{}.{}'.format(name, zone.data['name'])
+            name = '{}.{}'.format(name, zone.info['name'])
 
-        new_rrset = RRset(name=name, type=self.args.type)
         # look for existing rrset
-        for rrset in zone.rrsets:
-            if rrset == new_rrset:
-                new_rrset = rrset
-                break
+        existing = zone.rrset(name, self.args.type)
+        before = existing.state() if existing is not None else None
+        new_rrset = existing or RRset(name=name, type=self.args.type)
 
         new_rrset.ttl = self.args.ttl
 
         record = Record(content=self.args.content, disabled=self.args.disabled, set_ptr=self.args.set_ptr)
         if self.args.mode == 'add':
+            # records compare by content, replace the flags of an existing one
+            new_rrset.records.discard(record)
             new_rrset.records.add(record)
         elif self.args.mode == 'replace':
             new_rrset.records.clear()
@@ -108,17 +138,27 @@ class RRSET(PDNSCommand):
         elif self.args.mode == 'delete':
             new_rrset.records.discard(record)
 
+        if new_rrset.state() == before or (existing is None and not new_rrset.records):
+            self._print_unchanged(new_rrset)
+            return
         zone.update_rrsets([new_rrset])
 
+    def _print_unchanged(self, rrset):
+        # a PATCH that changes nothing would still bump the serial with soa_edit_api
+        print('{} {} unchanged'.format(rrset.name, rrset.type))
+
     def delete_rrset(self):
         server = self.api.server(self.args.server)
         zone = server.zone(self.args.zone)
 
         name = self.args.name
         if not name.endswith('.'):
-            name = '{}.{}'.format(name, zone.data['name'])
+            name = '{}.{}'.format(name, zone.info['name'])
 
-        rrset = RRset(name=name, type=self.args.type)
+        rrset = zone.rrset(name, self.args.type)
+        if rrset is None:
+            self._print_unchanged(RRset(name=name, type=self.args.type))
+            return
         zone.update_rrsets([rrset], delete=True)
 
     def edit_rrset_comments(self):
@@ -127,17 +167,14 @@ class RRSET(PDNSCommand):
 
         name = self.args.name
         if not name.endswith('.'):
-            name = '{}.{}'.format(name, zone.data['name'])
+            name = '{}.{}'.format(name, zone.info['name'])
 
-        new_rrset = RRset(name=name, type=self.args.type)
         # look for existing rrset
-        for rrset in zone.rrsets:
-            if rrset == new_rrset:
-                new_rrset = rrset
-                break
+        new_rrset = zone.rrset(name, self.args.type)
 
-        if not new_rrset.records:  # no records means it didn't come from the API
+        if new_rrset is None:
             self.fail('RRset {}/{} not found'.format(name, self.args.type))
+        before = new_rrset.state()
 
         comment = Comment(content=self.args.content, account=self.args.account, modified_at=time.time())
         if self.args.mode == 'add':
@@ -148,5 +185,61 @@ class RRSET(PDNSCommand):
         elif self.args.mode == 'delete':
             new_rrset.comments.discard(comment)
 
+        if new_rrset.state() == before:
+            self._print_unchanged(new_rrset)
+            return
         zone.update_rrsets([new_rrset])
 
+    def apply(self):
+        server = self.api.server(self.args.server)
+
+        change_format = guess_format(self.args.file, self.args.format)
+        try:
+            with open_input(self.args.file) as change_file:
+                changes = list(read_changes(change_file, format=change_format, zone=self.args.zone))
+        except ChangeError as e:
+            self.fail('{}: {}', self.args.file, e)
+
+        for result in apply_changes(server, changes):
+            print('{}: {} changes coalesced into {} RRsets ({} replaced, {} deleted, {} unchanged) in {:.3f}s'.format(
+                result.zone, result.changes, result.rrsets + result.unchanged, result.replaced, result.deleted,
+                result.unchanged, result.elapsed))
+
+    def set_ttl(self):
+        server = self.api.server(self.args.server)
+        zone = server.zone(self.args.zone)
+
+        if self.args.name is None:
+            match_name = None
+        elif self.args.glob:
+            pattern = self.args.name.lower()
+            match_name = lambda name: fnmatchcase(name.lower(), pattern)
+        else:
+            try:
+                match_name = re.compile(self.args.name, re.IGNORECASE).search
+            except re.error as e:
+                self.fail('invalid --name pattern: {}', e)
+
+        types = {rrtype.upper() for rrtype in self.args.types or []}
+        exclude_types = {rrtype.upper() for rrtype in self.args.exclude_types}
+
+        changed = []
+        for rrset in sorted(zone.rrsets, key=attrgetter('name', 'type')):
+            if rrset.ttl == self.args.ttl:
+                continue
+            if (types and rrset.type not in types) or rrset.type in exclude_types:
+                continue
+            if match_name is not None and not match_name(rrset.name):
+                continue
+
+            for record in sorted(rrset.records, key=attrgetter('content')):
+                print('-{}\t{}\tIN\t{}\t{}'.format(rrset.name, rrset.ttl, rrset.type, record.content))
+                print('+{}\t{}\tIN\t{}\t{}'.format(rrset.name, self.args.ttl, rrset.type, record.content))
+            rrset.ttl = self.args.ttl
+            changed.append(rrset)
+
+        if changed and not self.args.dry_run:
+            zone.update_rrsets(changed)
+
+        print('{} RRsets {}'.format(len(changed), 'would be updated' if self.args.dry_run else 'updated'),
+              file=sys.stderr)
@@ -1,16 +1,107 @@
-from . import PDNSCommand
+from . import PDNSCommand, add_action_parser, add_target_arguments
+import queue
+import sys
+import threading
+
+OBJECT_TYPES = ('all', 'zone', 'record', 'comment')
+
+# search-data results are printed as these columns, missing ones left empty
+COLUMNS = ('object_type', 'name', 'type', 'content', 'zone')
+
+
+def result_key(result):
+    return tuple(str(result.get(column, '')) for column in COLUMNS)
+
+
 class SEARCH(PDNSCommand):
     NAME = 'search'
     DESCRIPTION = 'search related API actions'
-    COMMANDS = ['search', 'search-log']
 
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
         # search
 
-        subparsers.add_parser('search', help='search across all zones, records and comments')
+        search = add_action_parser(subparsers, 'search')
+        search.add_argument('--max', type=int, help='maximum number of results per server (server default: 100)')
+        search.add_argument('--object-type', choices=OBJECT_TYPES, help='only return this type of object')
+        add_target_arguments(search, 'search')
+        search.add_argument('--unsorted', action='store_true',
+                            help='print results as they arrive instead of merged and sorted at the end')
+        search.add_argument('query', help='search term, * and ? are wildcards')
 
-        subparsers.add_parser('search-log', help='search in the log')
+        search_log = add_action_parser(subparsers, 'search-log')
+        search_log.add_argument('query', help='search term')
 
     def run(self):
-        self.fail('This command is not yet implemented')
+        getattr(self, (self.args.action).replace('-', '_'))()
+
+    def iter_results(self, targets):
+        """
+        Query every target in its own thread, yield (label, result) as results
+        are parsed and (label, exception) for targets that failed.
+        """
+        results = queue.Queue(maxsize=1000)
+        done = object()
+
+        def search(label, server):
+            try:
+                for result in server.search(self.args.query, max=self.args.max,
+                                            object_type=self.args.object_type):
+                    results.put((label, result))
+            except Exception as e:
+                results.put((label, e))
+            finally:
+                results.put((label, done))
+
+        for label, server in targets:
+            threading.Thread(target=search, args=(label, server), daemon=True).start()
+
+        running = len(targets)
+        while running:
+            label, result = results.get()
+            if result is done:
+                running -= 1
+            else:
+                yield label, result
+
+    def search(self):
+        """
+        Search every target concurrently and print each result once, with the
+        targets it was found on when searching more than one.
+        """
+        targets = self.server_targets()
+        fan_out = len(targets) > 1
+
+        found = {}
+        failed = 0
+        for label, result in self.iter_results(targets):
+            if isinstance(result, Exception):
+                print('{}: {}'.format(label, result), file=sys.stderr)
+                failed += 1
+                continue
+            key = result_key(result)
+            if key in found:
+                found[key].append(label)
+                continue
+            found[key] = [label]
+            if self.args.unsorted:
+                self.print_result(key, [label] if fan_out else None)
+
+        if not self.args.unsorted:
+            for key in sorted(found, key=lambda key: (key[4], key[1], key[0], key[2], key[3])):
+                self.print_result(key, sorted(found[key]) if fan_out else None)
+
+        if failed:
+            self.fail('{} of {} servers could not be searched', failed, len(targets))
+
+    def print_result(self, key, labels):
+        columns = list(key)
+        if labels is not None:
+            columns.append(','.join(labels))
+        print('\t'.join(columns))
+
+    def search_log(self):
+        server = self.api.server(self.args.server)
+
+        for line in server.search_log(self.args.query):
+            print(line)
@@ -1,22 +1,21 @@
-from . import PDNSCommand
+from . import PDNSCommand, add_action_parser
 from operator import attrgetter
 class SERVER(PDNSCommand):
     NAME = 'server'
     DESCRIPTION = 'Server related API actions'
-    COMMANDS = ['list-servers', 'show-server', 'add-server', 'edit-server', 'delete-server']
 
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
         # servers
-        subparsers.add_parser('list-servers', help='list servers')
+        add_action_parser(subparsers, 'list-servers')
 
-        subparsers.add_parser('show-server', help='show details for a server')
+        add_action_parser(subparsers, 'show-server')
 
-        subparsers.add_parser('add-server', help='add a new server (pdnscontrol only)')
+        add_action_parser(subparsers, 'add-server')
 
-        subparsers.add_parser('edit-server', help='add a new server (pdnscontrol only)')
+        add_action_parser(subparsers, 'edit-server')
 
-        subparsers.add_parser('delete-server', help='delete a server (pdnscontrol only)')
+        add_action_parser(subparsers, 'delete-server')
 
     def run(self):
         getattr(self, (self.args.action).replace('-', '_'))()
@@ -0,0 +1,158 @@
+from . import PDNSCommand, add_action_parser
+from tabular import read_log
+from throttle import run_concurrently
+import gzip
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+
+
+def zone_filename(zone_id):
+    if zone_id == '.':
+        zone_id = '@.'
+    return '{}json.gz'.format(zone_id.replace('/', '=2F'))
+
+
+class DirectorySnapshot(object):
+    """
+    One gzipped JSON file per zone in a directory, each replaced atomically.
+    """
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.index_path = os.path.join(path, 'index.jsonl')
+
+    def has(self, filename):
+        return os.path.exists(os.path.join(self.path, filename))
+
+    def save(self, zone, filename):
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file, gzip.GzipFile(fileobj=tmp_file, mode='wb') as zone_file:
+                size = zone.save(zone_file)
+            os.replace(tmp_path, os.path.join(self.path, filename))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return size
+
+    def close(self):
+        pass
+
+
+class ArchiveSnapshot(object):
+    """
+    One gzipped JSON member per zone appended to an uncompressed tar archive.
+    A zone saved again is appended again, the last member wins on extraction.
+    """
+
+    def __init__(self, path):
+        self.tar = tarfile.open(path, 'a')
+        self.names = set(self.tar.getnames())
+        self.lock = threading.Lock()
+        self.index_path = path + '.index.jsonl'
+
+    def has(self, filename):
+        return filename in self.names
+
+    def save(self, zone, filename):
+        with tempfile.TemporaryFile() as tmp_file:
+            with gzip.GzipFile(fileobj=tmp_file, mode='wb') as zone_file:
+                size = zone.save(zone_file)
+            info = tarfile.TarInfo(filename)
+            info.size = tmp_file.tell()
+            info.mtime = time.time()
+            tmp_file.seek(0)
+            with self.lock:
+                self.tar.addfile(info, tmp_file)
+                self.tar.fileobj.flush()
+                self.names.add(filename)
+        return size
+
+    def close(self):
+        self.tar.close()
+
+
+class SNAPSHOT(PDNSCommand):
+    NAME = 'snapshot'
+    DESCRIPTION = 'snapshot related API actions'
+
+    @classmethod
+    def init_parser(cls, subparsers, zone_parser):
+        snapshot = add_action_parser(subparsers, 'snapshot')
+        snapshot.add_argument('--workers', type=int, default=8, help='zones fetched concurrently (default: 8)')
+        snapshot.add_argument('--rate', type=float, help='maximum zone requests per second')
+        snapshot.add_argument('--full', action='store_true',
+                              help='fetch every zone, even when its serial is unchanged since the last snapshot')
+        snapshot.add_argument('target', help='directory for per-zone files, or a .tar archive')
+
+    def run(self):
+        getattr(self, (self.args.action).replace('-', '_'))()
+
+    def snapshot(self):
+        """
+        Stream every zone into its own gzipped JSON file as soon as it arrives.
+
+        Finished zones are appended to an index with their serials, so running
+        the same snapshot again resumes an interrupted one and skips zones
+        whose serial hasn't changed since.
+        """
+        server = self.api.server(self.args.server)
+        self.api.reserve_connections(self.args.workers)
+
+        if self.args.target.endswith('.tar'):
+            snapshot = ArchiveSnapshot(self.args.target)
+        else:
+            snapshot = DirectorySnapshot(self.args.target)
+
+        # an interrupted run may have left a partly written last line, cut off here
+        index = {entry['zone']: entry for entry in read_log(snapshot.index_path) if 'zone' in entry}
+
+        zones = []
+        skipped = 0
+        for zone in server.zones:
+            entry = index.get(zone.id)
+            if (not self.args.full and entry is not None
+                    and entry['serial'] == zone.info.get('serial')
+                    and entry['edited_serial'] == zone.info.get('edited_serial')
+                    and snapshot.has(entry['file'])):
+                skipped += 1
+            else:
+                zones.append(zone)
+
+        def save(zone):
+            filename = zone_filename(zone.id)
+            return {
+                'zone': zone.id,
+                'serial': zone.info.get('serial'),
+                'edited_serial': zone.info.get('edited_serial'),
+                'file': filename,
+                'bytes': snapshot.save(zone, filename),
+                'time': time.time(),
+            }
+
+        start = time.monotonic()
+        saved = failed = 0
+        try:
+            with open(snapshot.index_path, 'a') as index_file:
+                for zone, entry, exception in run_concurrently(save, zones, workers=self.args.workers,
+                                                               rate=self.args.rate):
+                    if exception is not None:
+                        print('{}: {}'.format(zone.id, exception), file=sys.stderr)
+                        failed += 1
+                        continue
+                    index_file.write(json.dumps(entry) + '\n')
+                    index_file.flush()
+                    saved += 1
+        finally:
+            snapshot.close()
+
+        print('{} zones saved, {} unchanged, {} failed in {:.1f}s'.format(
+            saved, skipped, failed, time.monotonic() - start))
+        if failed:
+            self.fail('{} of {} zones could not be saved', failed, len(zones))
@@ -1,14 +1,255 @@
-from . import PDNSCommand
+from . import PDNSCommand, add_action_parser, add_target_arguments
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import os
+import re
+import sys
+import tempfile
+import time
+
+# statistics that report a current level rather than a running total; no
+# rate is computed for these or for names ending in GAUGE_SUFFIXES
+GAUGES = frozenset([
+    'concurrent-queries', 'open-tcp-connections', 'qsize-a', 'qsize-q', 'security-status',
+    'tcp-clients', 'xfr-queue',
+])
+GAUGE_SUFFIXES = ('-size', '-entries', 'latency', '-usage')
+
+
+@lru_cache(maxsize=None)
+def is_gauge(name):
+    return name in GAUGES or name.endswith(GAUGE_SUFFIXES)
+
+
+def parse_value(value):
+    """
+    Return a statistic value as a number, None if it is not one.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def flatten(items):
+    """
+    Yield ((name, key), value) for every statistic item, key being None for
+    plain items and the entry name for map and ring items.
+    """
+    for item in items:
+        if item['type'] == 'StatisticItem':
+            yield (item['name'], None), item['value']
+        else:
+            for entry in item['value']:
+                yield (item['name'], entry['name']), entry['value']
+
+
+def display_name(name, key):
+    return name if key is None else '{}[{}]'.format(name, key)
+
+
+@lru_cache(maxsize=None)
+def metric_name(name):
+    return 'pdns_' + re.sub('[^a-zA-Z0-9_]', '_', name)
+
+
+def escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class StatisticsPoller(object):
+    """
+    Poll the statistics of one server, keeping the previous values to
+    compute per-second rates of the counters.
+    """
+
+    def __init__(self, label, server, statistics):
+        self.label = label
+        self.server = server
+        self.statistics = statistics
+        self.values = {}
+        self.rates = {}
+        self.time = None
+        self.error = None
+        # statistics skipped because their value is not a number, and those
+        # first skipped by the last poll, to be reported once
+        self.skipped = set()
+        self.newly_skipped = []
+
+    def fetch(self):
+        if not self.statistics:
+            return self.server.statistics(includerings=False)
+        items = []
+        for statistic in self.statistics:
+            items.extend(self.server.statistics(statistic=statistic))
+        return items
+
+    def poll(self):
+        try:
+            items = self.fetch()
+        except Exception as e:
+            self.error = e
+            self.values = {}
+            self.rates = {}
+            self.time = None
+            return
+        now = time.monotonic()
+        self.error = None
+        self.newly_skipped = []
+
+        previous, elapsed = self.values, (now - self.time if self.time is not None else None)
+        values = {}
+        rates = {}
+        for key, raw_value in flatten(items):
+            value = parse_value(raw_value)
+            if value is None:
+                if key not in self.skipped:
+                    self.skipped.add(key)
+                    self.newly_skipped.append((key, raw_value))
+                continue
+            values[key] = value
+            before = previous.get(key)
+            # a counter going down means the server restarted
+            if before is not None and elapsed and not is_gauge(key[0]) and value >= before:
+                rates[key] = (value - before) / elapsed
+        self.values, self.rates, self.time = values, rates, now
+
+
 class STATISTICS(PDNSCommand):
     NAME = 'statistics'
     DESCRIPTION = 'statistics related API actions'
-    COMMANDS = ['statistics']
 
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
         # statistics
 
-        subparsers.add_parser('statistics', help='show internal statistics')
+        statistics = add_action_parser(subparsers, 'statistics')
+        statistics.add_argument('--statistic', action='append', default=[], metavar='NAME',
+                                help='only fetch this statistic, filtered by the server (repeatable, '
+                                     'one request each)')
+        statistics.add_argument('--watch', type=float, metavar='INTERVAL',
+                                help='poll every INTERVAL seconds and show per-second rates of counters')
+        statistics.add_argument('--count', type=int, help='stop watching after this many polls')
+        statistics.add_argument('--textfile', metavar='FILE',
+                                help='with --watch, atomically rewrite FILE in Prometheus text format after '
+                                     'every poll (e.g. for the node_exporter textfile collector)')
+        statistics.add_argument('--quiet', action='store_true', help='with --watch, print nothing on stdout')
+        add_target_arguments(statistics, 'poll')
 
     def run(self):
-        self.fail('This command is not yet implemented')
+        getattr(self, (self.args.action).replace('-', '_'))()
+
+    def statistics(self):
+        targets = self.server_targets()
+        if self.args.watch is not None:
+            return self.watch(targets)
+
+        fan_out = len(targets) > 1
+        for label, server in targets:
+            if self.args.statistic:
+                items = []
+                for statistic in self.args.statistic:
+                    items.extend(server.statistics(statistic=statistic))
+            else:
+                items = server.statistics()
+            for (name, key), value in sorted(flatten(items)):
+                if fan_out:
+                    print('{}\t{}: {}'.format(label, display_name(name, key), value))
+                else:
+                    print('{}: {}'.format(display_name(name, key), value))
+
+    def watch(self, targets):
+        """
+        Poll every target each interval over its kept-alive session, servers
+        concurrently. Polls are scheduled on a fixed clock, a slow poll skips
+        ticks rather than drifting.
+        """
+        if self.args.watch <= 0:
+            self.fail('--watch interval must be positive')
+
+        pollers = [StatisticsPoller(label, server, self.args.statistic) for label, server in targets]
+        executor = ThreadPoolExecutor(max_workers=min(len(pollers), 32)) if len(pollers) > 1 else None
+        interval = self.args.watch
+        polls = 0
+        next_poll = time.monotonic()
+        try:
+            while True:
+                if executor is None:
+                    pollers[0].poll()
+                else:
+                    list(executor.map(StatisticsPoller.poll, pollers))
+                polls += 1
+
+                for poller in pollers:
+                    if poller.error is not None:
+                        print('{}: {}'.format(poller.label, poller.error), file=sys.stderr)
+                    for key, value in poller.newly_skipped:
+                        print('{}: skipping {}, not a number: {!r}'.format(
+                            poller.label, display_name(*key), value), file=sys.stderr)
+                if not self.args.quiet:
+                    self.print_poll(pollers)
+                if self.args.textfile:
+                    self.write_textfile(pollers)
+
+                if self.args.count is not None and polls >= self.args.count:
+                    return
+                now = time.monotonic()
+                next_poll += interval
+                if next_poll < now:
+                    next_poll += (now - next_poll) // interval * interval + interval
+                time.sleep(next_poll - now)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def print_poll(self, pollers):
+        fan_out = len(pollers) > 1
+        lines = [time.strftime('%H:%M:%S')]
+        for poller in pollers:
+            prefix = poller.label + '\t' if fan_out else ''
+            rates = poller.rates
+            for key, value in sorted(poller.values.items()):
+                rate = rates.get(key)
+                lines.append('{}{:<40} {:>16} {:>12}'.format(
+                    prefix, display_name(*key), value, '' if rate is None else '{:.1f}/s'.format(rate)))
+        print('\n'.join(lines), flush=True)
+
+    def write_textfile(self, pollers):
+        """
+        Write every value in the Prometheus text format to a temporary file
+        next to --textfile and rename it over, so readers never see a partial file.
+        """
+        metrics = {}
+        up = []
+        for poller in pollers:
+            server = escape_label(poller.label)
+            up.append('pdns_up{{server="{}"}} {}'.format(server, 0 if poller.error else 1))
+            for (name, key), value in poller.values.items():
+                lines = metrics.setdefault(name, [])
+                metric = metric_name(name)
+                if key is None:
+                    lines.append('{}{{server="{}"}} {}'.format(metric, server, value))
+                else:
+                    lines.append('{}{{server="{}",key="{}"}} {}'.format(metric, server, escape_label(key), value))
+
+        output = ['# TYPE pdns_up gauge'] + up
+        for name in sorted(metrics):
+            output.append('# TYPE {} {}'.format(metric_name(name), 'gauge' if is_gauge(name) else 'counter'))
+            output.extend(metrics[name])
+
+        directory = os.path.dirname(os.path.abspath(self.args.textfile))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.pdns-statistics', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as tmp_file:
+                tmp_file.write('\n'.join(output) + '\n')
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, self.args.textfile)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,116 @@
+from . import PDNSCommand, add_action_parser
+from models import RRset
+from operator import attrgetter
+from zonefile import ZoneFileError, iter_bind_rrsets, iter_json_rrsets
+import json
+import sys
+
+
+class SYNC(PDNSCommand):
+    NAME = 'sync'
+    DESCRIPTION = 'zone file synchronisation API actions'
+
+    @classmethod
+    def init_parser(cls, subparsers, zone_parser):
+        sync = add_action_parser(subparsers, 'sync', parents=[zone_parser])
+        sync.add_argument('--format', choices=('bind', 'json'),
+                          help='zone file format (default: json for .json files, else bind)')
+        sync.add_argument('--plan', action='store_true',
+                          help='print the changes and the size of their PATCH requests without applying them')
+        sync.add_argument('--ignore-types', default='SOA', metavar='TYPE,...',
+                          help='comma separated RRset types left alone on both sides (default: SOA, as the '
+                               'server maintains the serial; pass an empty string to include it)')
+        sync.add_argument('--max-changes', type=int, default=1000, help='maximum RRset changes per PATCH request')
+        sync.add_argument('--max-bytes', type=int, default=1000000,
+                          help='maximum PATCH request body size in bytes (approximate)')
+        sync.add_argument('file', help='zone file in BIND or API JSON format, - for stdin')
+
+    def run(self):
+        getattr(self, (self.args.action).replace('-', '_'))()
+
+    def sync(self):
+        """
+        Compare RRset digests of the zone on the server and in the file, then
+        replace the RRsets that differ and delete those missing from the file.
+        Only digests of the server side are kept in memory.
+        """
+        server = self.api.server(self.args.server)
+        zone = server.zone(self.args.zone)
+        ignore_types = {rrtype.strip().upper() for rrtype in self.args.ignore_types.split(',') if rrtype.strip()}
+
+        remote = {}
+        for rrset in zone.iter_rrsets():
+            if rrset.type not in ignore_types:
+                remote[(rrset.name.lower(), rrset.type)] = (rrset.name, rrset.digest())
+
+        replace = []
+        seen = set()
+        try:
+            for rrset in self._read_zone_file(zone.info['name']):
+                key = (rrset.name.lower(), rrset.type)
+                if rrset.type in ignore_types or key in seen:
+                    continue
+                if rrset.ttl is None:
+                    self.fail('{} {} has no TTL', rrset.name, rrset.type)
+                seen.add(key)
+                if key not in remote:
+                    replace.append(('+', rrset))
+                elif remote[key][1] != rrset.digest():
+                    replace.append(('~', rrset))
+        except ZoneFileError as e:
+            self.fail('{}: {}', self.args.file, e)
+
+        delete = [RRset(name=name, type=key[1]) for key, (name, _) in remote.items() if key not in seen]
+
+        batches = self._batches(replace, delete)
+
+        if self.args.plan:
+            for status, rrset in replace:
+                print('{} {} {}'.format(status, rrset.name, rrset.type))
+                for record in sorted(rrset.records, key=attrgetter('content')):
+                    print('    {}\t{}\tIN\t{}\t{}'.format(rrset.name, rrset.ttl, rrset.type, record.content))
+            for rrset in delete:
+                print('- {} {}'.format(rrset.name, rrset.type))
+        else:
+            for batch_replace, batch_delete, _ in batches:
+                zone.patch_rrsets(replace=batch_replace, delete=batch_delete, comments=False)
+
+        added = sum(1 for status, _ in replace if status == '+')
+        print('{}{} added, {} changed, {} deleted in {} PATCH requests ({} bytes)'.format(
+            'plan: ' if self.args.plan else '', added, len(replace) - added, len(delete),
+            len(batches), sum(size for _, _, size in batches)), file=sys.stderr)
+
+    def _read_zone_file(self, origin):
+        file_format = self.args.format
+        if file_format is None:
+            file_format = 'json' if self.args.file.endswith('.json') else 'bind'
+
+        if file_format == 'json':
+            fileobj = sys.stdin.buffer if self.args.file == '-' else open(self.args.file, 'rb')
+            with fileobj:
+                yield from iter_json_rrsets(fileobj)
+        else:
+            fileobj = sys.stdin if self.args.file == '-' else open(self.args.file)
+            with fileobj:
+                yield from iter_bind_rrsets(fileobj, origin)
+
+    def _batches(self, replace, delete):
+        """
+        Split the changes into (replace, delete, size) batches that each stay
+        under --max-changes RRsets and about --max-bytes of JSON.
+        """
+        changes = [(rrset, False) for _, rrset in replace] + [(rrset, True) for rrset in delete]
+        batches = []
+        batch_replace, batch_delete, batch_size = [], [], 0
+        for rrset, is_delete in changes:
+            size = len(json.dumps(rrset.to_dict())) + 30
+            if (batch_replace or batch_delete) and (
+                    len(batch_replace) + len(batch_delete) >= self.args.max_changes
+                    or batch_size + size > self.args.max_bytes):
+                batches.append((batch_replace, batch_delete, batch_size))
+                batch_replace, batch_delete, batch_size = [], [], 0
+            (batch_delete if is_delete else batch_replace).append(rrset)
+            batch_size += size
+        if batch_replace or batch_delete:
+            batches.append((batch_replace, batch_delete, batch_size))
+        return batches
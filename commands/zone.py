@@ -1,9 +1,27 @@
-from . import PDNSCommand
-from operator import attrgetter
+from . import PDNSCommand, add_action_parser, add_endpoint_arguments
+from fnmatch import fnmatchcase
+from operator import itemgetter
+from tabular import guess_format, open_input, read_log
+from throttle import run_concurrently
+from zonespecs import ZoneSpecError, read_zone_specs
+import json
+import sys
+import time
+
+
+def format_field(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if isinstance(value, list):
+        return ','.join(str(item) for item in value)
+    return str(value)
+
+
 class ZONE(PDNSCommand):
     NAME = 'zone'
     DESCRIPTION = 'Zone related API actions'
-    COMMANDS = ['list-zones', 'show-zone', 'add-zone', 'edit-zone']
 
     def __init__(self, *args, **kwargs):
         """
@@ -15,12 +33,20 @@ class ZONE(PDNSCommand):
     @classmethod
     def init_parser(cls, subparsers, zone_parser):
         # zones
-        subparsers.add_parser('list-zones', help='list zones')
-
-        subparsers.add_parser('show-zone', parents=[zone_parser], help='show details for a zone')
-
-        add_zone = subparsers.add_parser('add-zone',
-                                         help='add a new zone, return zone ID')
+        list_zones = add_action_parser(subparsers, 'list-zones')
+        list_zones.add_argument('--filter', metavar='PATTERN',
+                                help='only zones matching PATTERN, a glob (*, ? and [...]) or an exact zone name, '
+                                     'which the server looks up itself')
+        list_zones.add_argument('--unsorted', action='store_true',
+                                help='print zones in server order while the listing is downloading, '
+                                     'using little memory on servers with many zones')
+        list_zones.add_argument('--columns', metavar='FIELD,...', default='id',
+                                help='comma separated zone fields to print, tab separated, e.g. '
+                                     'id,kind,serial,dnssec,account,masters (default: id)')
+
+        add_action_parser(subparsers, 'show-zone', parents=[zone_parser])
+
+        add_zone = add_action_parser(subparsers, 'add-zone')
         add_zone.add_argument('name', help='zone name (must include the trailing dot)')
         add_zone.add_argument('--kind', choices=('Native', 'Master', 'Slave', 'Forwarded'), default='Master',
                               help='kind of zone')
@@ -34,34 +60,73 @@ class ZONE(PDNSCommand):
                               help='set the RD bit for forwarded zones (authoritative only)')
         add_zone.add_argument('--soa-edit-api', choices=('DEFAULT', 'INCREASE', 'EPOCH', 'SOA-EDIT', 'SOA-EDIT-INCREASE'), help='SOA EDIT API setting')
         add_zone.add_argument('--soa-edit', choices=('INCREMENT-WEEKS', 'INCEPTION-EPOCH', 'INCEPTION-INCREMENT', 'EPOCH', 'NONE'), help='SOA EDIT setting for dnssec https://doc.powerdns.com/authoritative/dnssec/operational.html#soa-edit-ensure-signature-freshness-on-slaves')
-
-        edit_zone = subparsers.add_parser('edit-zone', parents=[zone_parser], help='add a new zone')
+        add_endpoint_arguments(add_zone)
+
+        add_zones = add_action_parser(subparsers, 'add-zones')
+        add_zones.add_argument('--format', choices=('jsonl', 'csv'),
+                               help='zone file format (default: guessed from the file name, else jsonl)')
+        add_zones.add_argument('--workers', type=int, default=8, help='zones created concurrently (default: 8)')
+        add_zones.add_argument('--rate', type=float, help='maximum zone creations per second')
+        add_zones.add_argument('--progress', metavar='FILE',
+                               help='progress log, zones recorded in it are skipped when run again '
+                                    '(default: FILE.progress.jsonl next to the zone file)')
+        add_zones.add_argument('file', help='zone file with name, kind, nameservers, masters, account, '
+                                            'soa_edit_api and rrsets fields (default: stdin)', nargs='?', default='-')
+
+        edit_zone = add_action_parser(subparsers, 'edit-zone', parents=[zone_parser])
         edit_zone.add_argument('--kind', choices=('Native', 'Master', 'Slave', 'Forwarded'), help='kind of zone')
         edit_zone.add_argument('--masters', nargs='+', metavar="SERVER", help='master servers')
         edit_zone.add_argument('--servers', nargs='+', metavar="SERVER",
                                help='forwarded-to servers (recursor only)')
         edit_zone.add_argument('--account', help='account (authoritative only)')
-        edit_zone.add_argument('--recursion-desired', action='store_true',
+        # None unless given, so edits of other fields leave the RD bit alone
+        edit_zone.add_argument('--recursion-desired', action='store_true', default=None,
                                help='set the RD bit for forwarded zones (authoritative only)')
         edit_zone.add_argument('--soa-edit-api', choices=('DEFAULT', 'INCREASE', 'EPOCH', 'SOA-EDIT', 'SOA-EDIT-INCREASE'), help='SOA EDIT API serial update strategy https://doc.powerdns.com/authoritative/domainmetadata.html#soa-edit-api')
         edit_zone.add_argument('--soa-edit', choices=('INCREMENT-WEEKS', 'INCEPTION-EPOCH', 'INCEPTION-INCREMENT', 'EPOCH', 'NONE'), help='SOA EDIT setting for dnssec https://doc.powerdns.com/authoritative/dnssec/operational.html#soa-edit-ensure-signature-freshness-on-slaves')
+        add_endpoint_arguments(edit_zone)
 
-        subparsers.add_parser('delete-zone', parents=[zone_parser], help='delete a zone')
+        add_action_parser(subparsers, 'delete-zone', parents=[zone_parser])
 
     def run(self):
         getattr(self, (self.args.action).replace('-', '_'))()
 
     def list_zones(self):
+        """
+        Stream the zone listing, keeping only the selected columns of each
+        zone, and only until they are printed with --unsorted.
+        """
         server = self.api.server(self.args.server)
+        columns = [column.strip() for column in self.args.columns.split(',') if column.strip()]
+
+        pattern = self.args.filter
+        exact = None
+        if pattern is not None and not any(char in pattern for char in '*?['):
+            exact, pattern = pattern, None
+        elif pattern is not None:
+            pattern = pattern.lower()
+
+        rows = []
+        zones = server.iter_zones(zone=exact, dnssec='dnssec' in columns)
+        for zone in zones:
+            data = zone.info
+            if pattern is not None and not fnmatchcase(data['id'].lower(), pattern):
+                continue
+            row = [format_field(data.get(column)) for column in columns]
+            if self.args.unsorted:
+                print('\t'.join(row))
+            else:
+                rows.append((data['id'], row))
 
-        for zone in sorted(server.zones, key=attrgetter('id')):
-            print(zone.data['id'])
+        with self.api.span('output'):
+            for _, row in sorted(rows, key=itemgetter(0)):
+                print('\t'.join(row))
 
     def show_zone(self):
         server = self.api.server(self.args.server)
         zone = server.zone(self.args.zone)
 
-        for key, value in sorted(zone.data.items()):
+        for key, value in sorted(zone.info.items()):
             if key in ['rrsets', 'url'] or key.endswith('_url'):
                 continue
             print('{}: {}'.format(key, value))
@@ -80,7 +145,81 @@ class ZONE(PDNSCommand):
                 if getattr(self.args, key) is not None}
         zone = server.create_zone(self.args.name, kind=self.args.kind, nameservers=self.args.nameservers, **data)
 
-        print("Zone added with ID '{}'".format(zone.data['id']))
+        print("Zone added with ID '{}'".format(zone.info['id']))
+
+    def add_zones(self):
+        """
+        Validate every zone of the file first, then create the zones missing
+        from one listing of the server concurrently.
+
+        Created and already existing zones are appended to the progress log,
+        so running the same file again skips them without asking the server.
+        """
+        server = self.api.server(self.args.server)
+
+        spec_format = guess_format(self.args.file, self.args.format)
+        progress_path = self.args.progress
+        if progress_path is None and self.args.file != '-':
+            progress_path = self.args.file + '.progress.jsonl'
+
+        try:
+            with open_input(self.args.file) as spec_file:
+                specs = read_zone_specs(spec_file, format=spec_format)
+        except ZoneSpecError as e:
+            self.fail('{}:\n{}', self.args.file, e)
+
+        done = set()
+        if progress_path:
+            done = {entry['zone'].lower() for entry in read_log(progress_path)
+                    if entry.get('status') in ('created', 'exists') and 'zone' in entry}
+        resumed = len(specs)
+        specs = [spec for spec in specs if spec.name.lower() not in done]
+        resumed -= len(specs)
+
+        start = time.monotonic()
+        existing = {zone.id.lower() for zone in server.zones} if specs else set()
+        self.api.reserve_connections(self.args.workers)
+
+        def create(spec):
+            data = spec.zone_data()
+            return server.create_zone(data.pop('name'), **data)
+
+        progress_file = open(progress_path, 'a') if progress_path else None
+        counts = {'created': 0, 'exists': 0, 'failed': 0}
+
+        def record(zone_name, status, error=None):
+            counts[status] += 1
+            if progress_file is not None:
+                entry = {'zone': zone_name, 'status': status, 'time': time.time()}
+                if error is not None:
+                    entry['error'] = error
+                progress_file.write(json.dumps(entry) + '\n')
+                progress_file.flush()
+
+        try:
+            new_specs = []
+            for spec in specs:
+                if spec.name.lower() in existing:
+                    record(spec.name, 'exists')
+                else:
+                    new_specs.append(spec)
+
+            for spec, zone, exception in run_concurrently(create, new_specs, workers=self.args.workers,
+                                                          rate=self.args.rate):
+                if exception is not None:
+                    print('{}: {}'.format(spec.name, exception), file=sys.stderr)
+                    record(spec.name, 'failed', str(exception))
+                else:
+                    print("Zone added with ID '{}'".format(zone.id))
+                    record(spec.name, 'created')
+        finally:
+            if progress_file is not None:
+                progress_file.close()
+
+        print('{} zones created, {} already existing, {} done in an earlier run, {} failed in {:.1f}s'.format(
+            counts['created'], counts['exists'], resumed, counts['failed'], time.monotonic() - start))
+        if counts['failed']:
+            self.fail('{} of {} zones could not be created', counts['failed'], len(new_specs))
 
     def edit_zone(self):
         server = self.api.server(self.args.server)
@@ -89,10 +228,13 @@ class ZONE(PDNSCommand):
         data = {key: getattr(self.args, key)
                 for key in self.editable_zone_values
                 if getattr(self.args, key) is not None}
+        # loaded fresh, so an edit that changes nothing is not sent
+        info = zone.info
         # mandatory for some reason
         if 'kind' not in data:
-            data['kind'] = zone.data['kind']
-        zone.update(**data)
+            data['kind'] = info['kind']
+        if not zone.update(skip_unchanged=True, **data):
+            print('Zone {} unchanged'.format(zone.id))
 
     def delete_zone(self):
         server = self.api.server(self.args.server)
@@ -0,0 +1,84 @@
+"""
+Named API endpoints and groups of them, defined in the config file, for
+running a command against several PowerDNS deployments at once with --targets.
+
+    [endpoints.eu]
+    url = "https://dns-eu.example.com/api/v1/"
+    api-key = "secret"
+
+    [groups]
+    all = ["eu", "us"]
+"""
+
+import io
+import threading
+
+from contextlib import contextmanager
+
+
+class EndpointError(Exception):
+    pass
+
+
+def resolve_targets(config, targets):
+    """
+    Return (name, settings) pairs for the endpoints of a comma separated list
+    of group and endpoint names, in order and without duplicates.
+    """
+    endpoints = (config or {}).get('endpoints', {})
+    groups = (config or {}).get('groups', {})
+
+    resolved = {}
+    for target in targets.split(','):
+        target = target.strip()
+        if not target:
+            continue
+        if target in groups:
+            names = groups[target]
+        elif target in endpoints:
+            names = [target]
+        else:
+            raise EndpointError('no group or endpoint named {!r} in the config file'.format(target))
+        for name in names:
+            if name not in endpoints:
+                raise EndpointError('group {!r} names an undefined endpoint {!r}'.format(target, name))
+            resolved.setdefault(name, endpoints[name])
+
+    if not resolved:
+        raise EndpointError('no targets given')
+    return list(resolved.items())
+
+
+class ThreadOutput(object):
+    """
+    Replacement for sys.stdout sending what a thread prints inside capture()
+    to a buffer of its own, and everything else to the real stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    @contextmanager
+    def capture(self):
+        buffer = self.local.buffer = io.StringIO()
+        try:
+            yield buffer
+        finally:
+            del self.local.buffer
+
+    def _current(self):
+        buffer = getattr(self.local, 'buffer', None)
+        return self.stream if buffer is None else buffer
+
+    def write(self, data):
+        return self._current().write(data)
+
+    def flush(self):
+        self._current().flush()
+
+    def isatty(self):
+        return self._current().isatty()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
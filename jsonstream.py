@@ -0,0 +1,124 @@
+"""
+Incremental parsing of large JSON documents from an iterable of byte chunks,
+such as requests' Response.iter_content().
+
+Only the array being streamed is parsed element by element; each element and
+every other value is decoded whole with the standard json module, so memory
+stays bounded by the largest single element rather than the document.
+"""
+
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+
+class _Buffer(object):
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Append the next chunk, dropping what has been consumed. False at the end of input.
+        """
+        for chunk in self.chunks:
+            text = self.decoder.decode(chunk)
+            if text:
+                self.text = self.text[self.pos:] + text
+                self.pos = 0
+                return True
+        if not self.eof:
+            self.eof = True
+            self.text = self.text[self.pos:] + self.decoder.decode(b'', final=True)
+            self.pos = 0
+        return False
+
+    def next_char(self):
+        """
+        Return the next non-whitespace character without consuming it.
+        """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _whitespace:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                raise ValueError('unexpected end of JSON input')
+
+    def expect(self, char):
+        found = self.next_char()
+        if found != char:
+            raise ValueError('expected {!r} at offset {} but found {!r}'.format(char, self.pos, found))
+        self.pos += 1
+
+    def value(self):
+        """
+        Decode and consume one complete JSON value.
+        """
+        self.next_char()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise
+            # a number at the end of the buffer (or cut before its fraction or
+            # exponent) may continue in the next chunk
+            if not self.eof and (end == len(self.text) or self.text[end] in '.eE+-') and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_array(buf):
+    buf.expect('[')
+    if buf.next_char() == ']':
+        buf.pos += 1
+        return
+    while True:
+        yield buf.value()
+        if buf.next_char() == ',':
+            buf.pos += 1
+        else:
+            buf.expect(']')
+            return
+
+
+def iter_items(chunks, key=None, fields=None):
+    """
+    Yield the elements of a JSON array as they are parsed.
+
+    Without key the document itself must be an array. With key it must be an
+    object and the array under key is streamed; the object's other members are
+    stored in the fields dict as they are encountered, so they are complete
+    once iteration has finished.
+    """
+    buf = _Buffer(chunks)
+    if key is None:
+        yield from _iter_array(buf)
+        return
+
+    buf.expect('{')
+    if buf.next_char() == '}':
+        return
+    while True:
+        name = buf.value()
+        buf.expect(':')
+        if name == key:
+            yield from _iter_array(buf)
+        else:
+            value = buf.value()
+            if fields is not None:
+                fields[name] = value
+        if buf.next_char() == ',':
+            buf.pos += 1
+        else:
+            buf.expect('}')
+            return
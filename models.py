@@ -1,4 +1,9 @@
+import hashlib
 import json
+
+import jsonstream
+
+
 class Model(object):
 
     name = None
@@ -12,8 +17,12 @@ class Model(object):
 
     @classmethod
     def all(cls, api, parent=None):
-        return [cls(api, item[cls.id_attr], parent=parent, data=item)
-                for item in api.get(cls.collection_path(parent)).json()]
+        return cls.from_items(api, api.get_json(cls.collection_path(parent)), parent=parent)
+
+    @classmethod
+    def from_items(cls, api, items, parent=None):
+        with api.span('build {} models'.format(cls.__name__)):
+            return [cls(api, item[cls.id_attr], parent=parent, data=item) for item in items]
 
     @classmethod
     def collection_path(cls, parent=None):
@@ -23,9 +32,13 @@ class Model(object):
 
     @property
     def path(self):
+        # cryptokey IDs are integers
         if self.parent is not None:
-            return '/'.join((self.parent.path, self.name, self.id))
-        return '/'.join((self.name, self.id))
+            return '/'.join((self.parent.path, self.name, str(self.id)))
+        return '/'.join((self.name, str(self.id)))
+
+    def subpath(self, *parts):
+        return '/'.join((self.path,) + parts)
 
     @property
     def data(self):
@@ -36,30 +49,45 @@ class Model(object):
     @classmethod
     def create(cls, api, parent=None, data={}):
         response = api.post(cls.collection_path(parent), json=data)
-        response_json = ''
+        body = None if response.status_code == 204 else response.json()
+        data = cls.response_data(response.status_code, body, data)
+        return cls(api, data[cls.id_attr], parent=parent, data=data)
+
+    @staticmethod
+    def response_data(status_code, body, sent):
+        """
+        Return the object data after a write: the response body, or the data
+        that was sent if the server answered 204 No Content.
+        """
         # If the response was 204 no content success, the update worked
         # Fill out the response json with the inbound data
-        if response.status_code == 204:
-            response_json = json.dumps(data)
-        else:
-            response_json = response.json()
-        return cls(api, response_json[cls.id_attr], parent=parent, data=response_json)
+        if status_code == 204:
+            return dict(sent)
+        return body
 
     def load(self):
-        response = self.api.get(self.path)
-        self._data = response.json()
+        self._data = self.api.get_json(self.path)
 
     reload = load
 
-    def update(self, **kwargs):
-        # If the response was 204 no content success, the update worked
-        # Fill out the response json with the inbound data
+    def unchanged_by(self, fields):
+        """
+        True if the loaded data already holds every field with the given value.
+        """
+        return bool(self._data) and all(self._data.get(key) == value for key, value in fields.items())
+
+    def update(self, skip_unchanged=False, **kwargs):
+        """
+        Send the fields with a PUT. With skip_unchanged, nothing is sent when
+        the loaded data already holds the fields, so only use it right after
+        loading. Returns whether a request was sent.
+        """
+        if skip_unchanged and self.unchanged_by(kwargs):
+            return False
         response = self.api.put(self.path, json=kwargs)
-        if response.status_code == 204:
-            response_json = json.dumps(kwargs)
-        else:
-            response_json = response.json()
-        self._data = response_json
+        body = None if response.status_code == 204 else response.json()
+        self._data = self.response_data(response.status_code, body, dict(self._data, **kwargs))
+        return True
 
     def delete(self):
         self.api.delete(self.path)
@@ -82,19 +110,100 @@ class Server(Model):
 
     @property
     def zones(self):
-        return Zone.all(self.api, parent=self)
+        cache = self.api.cache
+        if cache is None or not cache.lookups:
+            return Zone.all(self.api, parent=self)
+
+        # a listing has no cheap validator, so it is only reused while fresh
+        key = Zone.listing_cache_key(self)
+        items = cache.get(key, max_age=cache.listing_max_age)
+        if items is None:
+            items = self.api.get_json(Zone.collection_path(self))
+            cache.put(key, items)
+        return Zone.from_items(self.api, items, parent=self)
+
+    def iter_zones(self, zone=None, dnssec=False, chunk_size=65536):
+        """
+        Yield the server's zones while the listing is downloaded and parsed,
+        holding one at a time. zone only lists the zone of that name, and
+        unless dnssec is true the server is asked to skip working out the
+        dnssec field of every zone.
+
+        A full listing is taken from the zone cache while fresh.
+        """
+        cache = self.api.cache
+        if zone is None and cache is not None and cache.lookups:
+            items = cache.get(Zone.listing_cache_key(self), max_age=cache.listing_max_age)
+            if items is not None:
+                for item in items:
+                    yield Zone(self.api, item['id'], parent=self, data=item)
+                return
+
+        params = {}
+        if zone is not None:
+            params['zone'] = zone
+        if not dnssec:
+            params['dnssec'] = 'false'
+        response = self.api.get(Zone.collection_path(self), params=params, stream=True)
+        with response:
+            for item in jsonstream.iter_items(response.iter_content(chunk_size)):
+                yield Zone(self.api, item['id'], parent=self, data=item)
 
     def zone(self, name):
         return Zone(self.api, name, parent=self)
 
     def create_zone(self, name, kind='Master', nameservers=[], **kwargs):
+        zone = Zone.create(self.api, parent=self, data=self.zone_data(name, kind, nameservers, **kwargs))
+        zone.invalidate_cache()
+        return zone
+
+    @staticmethod
+    def zone_data(name, kind='Master', nameservers=[], **kwargs):
         data = kwargs
         data.update({'name': name, 'kind': kind, 'nameservers': nameservers})
-        return Zone.create(self.api, parent=self, data=data)
+        return data
 
     def delete_zone(self, name):
         return Zone(self.api, name, parent=self).delete()
 
+    def search(self, q, max=None, object_type=None, chunk_size=65536):
+        """
+        Yield the results of a search-data query as they are parsed from the
+        response. q may contain * and ? wildcards, object_type is one of all,
+        zone, record or comment.
+        """
+        params = {'q': q}
+        if max is not None:
+            params['max'] = max
+        if object_type is not None:
+            params['object_type'] = object_type
+        response = self.api.get('{0}/search-data'.format(self.path), params=params, stream=True)
+        with response:
+            yield from jsonstream.iter_items(response.iter_content(chunk_size))
+
+    def statistics(self, statistic=None, includerings=True):
+        """
+        Return the server's statistic items, only the one named statistic if
+        given. includerings=False leaves out the (large) ring statistics.
+        """
+        params = {}
+        if statistic is not None:
+            params['statistic'] = statistic
+        if not includerings:
+            params['includerings'] = 'false'
+        return self.api.get_json('{0}/statistics'.format(self.path), params=params)
+
+    def search_log(self, q):
+        return self.api.get_json('{0}/search-log'.format(self.path), params={'q': q})
+
+    def flush_cache(self, domain):
+        """
+        Flush the cache entries of a domain, or of a domain and everything
+        below it when it ends with $. Returns the server's answer, with the
+        number of entries removed in count.
+        """
+        return self.api.put(self.subpath('cache', 'flush'), params={'domain': domain}).json()
+
 
 class ConfigSetting(Model):
 
@@ -106,31 +215,268 @@ class Zone(Model):
 
     name = 'zones'
 
+    # RRsetCollection built from the _data it was built from
+    _rrsets = None
+    _rrsets_data = None
+
+    @property
+    def info(self):
+        """
+        Zone details without RRsets, fetched with rrsets=false unless already loaded.
+        """
+        if not self._data:
+            self.load(rrsets=False)
+        return self._data
+
+    def load(self, rrsets=True):
+        cache = self.api.cache
+        if rrsets and cache is not None and cache.lookups:
+            return self._load_cached(cache)
+
+        self._data = self.api.get_json(self.path, params=self.load_params(rrsets))
+
+    @staticmethod
+    def load_params(rrsets=True):
+        return None if rrsets else {'rrsets': 'false'}
+
+    reload = load
+
+    def load_rrsets(self):
+        """
+        Return the zone data with its RRsets. Data without them, from a zone
+        listing or info, is replaced by a load of the whole zone, which is one
+        full GET per zone when looping over a listing.
+        """
+        if 'rrsets' not in self._data:
+            self.load()
+        return self._data
+
+    def save(self, fileobj, chunk_size=65536):
+        """
+        Write the zone JSON as sent by the server to fileobj without decoding it,
+        return the number of bytes written.
+        """
+        response = self.api.get(self.path, stream=True)
+        written = 0
+        with response:
+            for chunk in response.iter_content(chunk_size):
+                fileobj.write(chunk)
+                written += len(chunk)
+        return written
+
+    def export(self, fileobj, chunk_size=65536):
+        """
+        Write the zone in AXFR (BIND) format to fileobj as it is downloaded,
+        return the number of bytes written.
+        """
+        response = self.api.get('{0}/export'.format(self.path), stream=True,
+                                headers={'Accept': 'text/plain'})
+        with response:
+            if response.headers.get('Content-Type', '').startswith('application/json'):
+                # older servers wrap the zone in a JSON object; read through
+                # iter_content so that the request is timed like the others
+                body = b''.join(response.iter_content(chunk_size))
+                data = json.loads(body.decode('utf-8'))['zone'].encode('utf-8')
+                fileobj.write(data)
+                return len(data)
+
+            written = 0
+            for chunk in response.iter_content(chunk_size):
+                fileobj.write(chunk)
+                written += len(chunk)
+        return written
+
+    def _load_cached(self, cache):
+        """
+        Load the zone from the cache if its serials still match the server's,
+        which costs one rrsets=false request instead of the whole zone.
+        """
+        self.load(rrsets=False)
+        if 'rrsets' in self._data:  # server too old to honour rrsets=false
+            cache.put(self.cache_key, self._data, validator=self._cache_validator())
+            return
+
+        validator = self._cache_validator()
+        data = cache.get(self.cache_key, validator=validator)
+        if data is None:
+            data = self.api.get_json(self.path)
+            cache.put(self.cache_key, data, validator=validator)
+        self._data = data
+
+    def _cache_validator(self):
+        return [self._data.get('serial'), self._data.get('edited_serial')]
+
+    @property
+    def cache_key(self):
+        return [self.api.url, self.path]
+
+    @classmethod
+    def listing_cache_key(cls, parent):
+        return [parent.api.url, cls.collection_path(parent)]
+
+    def invalidate_cache(self):
+        if self.api.cache is not None:
+            self.api.cache.invalidate(self.cache_key)
+            self.api.cache.invalidate(self.listing_cache_key(self.parent))
+
+    def update(self, skip_unchanged=False, **kwargs):
+        if not super().update(skip_unchanged=skip_unchanged, **kwargs):
+            return False
+        self.invalidate_cache()
+        return True
+
+    def delete(self):
+        super().delete()
+        self.invalidate_cache()
+
     @property
     def rrsets(self):
-        return {RRset(**rrset) for rrset in self.data['rrsets']}
+        """
+        The zone's RRsets, built once per load of the zone data, see load_rrsets.
+        """
+        data = self.load_rrsets()
+        if self._rrsets_data is not data:
+            with self.api.span('build rrsets'):
+                self._rrsets = RRsetCollection(RRset(**rrset) for rrset in data['rrsets'])
+            self._rrsets_data = data
+        return self._rrsets
+
+    def iter_rrsets(self, chunk_size=65536):
+        """
+        Yield RRsets while the zone is still being downloaded and parsed, so only
+        one RRset at a time is held in memory. The other zone fields become
+        available through info once iteration has finished.
+        """
+        response = self.api.get(self.path, stream=True)
+        fields = {}
+        with response:
+            for rrset in jsonstream.iter_items(response.iter_content(chunk_size), key='rrsets', fields=fields):
+                yield RRset(**rrset)
+        if not self._data:
+            self._data = fields
+
+    def rrset(self, name, type):
+        """
+        Fetch a single RRset with the rrset_name/rrset_type filters, None if it does not exist.
+        """
+        data = self.api.get_json(self.path, params={'rrset_name': name, 'rrset_type': type})
+        rrsets = data.pop('rrsets', [])
+        if not self._data:
+            self._data = data
+        for rrset in rrsets:
+            if rrset['name'] == name and rrset['type'] == type:
+                return RRset(**rrset)
+        return None
 
     def update_rrsets(self, rrsets, delete=False):
+        if delete:
+            self.patch_rrsets(delete=rrsets)
+        else:
+            self.patch_rrsets(replace=rrsets)
+
+    def patch_rrsets(self, replace=[], delete=[], comments=True):
+        """
+        Send REPLACE and DELETE changes for any number of RRsets in a single PATCH.
+
+        With comments=False replaced RRsets keep the comments they have on the server.
+        """
+        self.api.patch(self.path, json=self.patch_body(replace, delete, comments))
+        self._data = {}  # clear to force refresh on next access
+        self._rrsets = self._rrsets_data = None
+        self.invalidate_cache()
+
+    @staticmethod
+    def patch_body(replace=[], delete=[], comments=True):
         rrsets_changes = []
-        for rrset in rrsets:
+        for rrset in replace:
             rrset_change = rrset.to_dict()
-            if delete:
-                rrset_change['changetype'] = 'DELETE'
-                rrset_change['records'] = []
-                rrset_change['comments'] = []
-                del rrset_change['ttl']
-            else:
-                rrset_change['changetype'] = 'REPLACE'
+            rrset_change['changetype'] = 'REPLACE'
+            if not comments:
+                del rrset_change['comments']
             rrsets_changes.append(rrset_change)
-        self.api.patch(self.path, json={'rrsets': rrsets_changes})
-        self._data = {}  # clear to force refresh on next access
+        for rrset in delete:
+            rrset_change = rrset.to_dict()
+            rrset_change['changetype'] = 'DELETE'
+            rrset_change['records'] = []
+            rrset_change['comments'] = []
+            del rrset_change['ttl']
+            rrsets_changes.append(rrset_change)
+        return {'rrsets': rrsets_changes}
+
+    @property
+    def cryptokeys(self):
+        return Cryptokey.all(self.api, parent=self)
+
+    def cryptokey(self, id):
+        return Cryptokey(self.api, id, parent=self)
+
+    @property
+    def metadata(self):
+        return Metadata.all(self.api, parent=self)
+
+    def metadata_entry(self, kind):
+        return Metadata(self.api, kind, parent=self)
 
     #Send a DNS NOTIFY to all slaves.
     def notify(self):
-        self.api.put('{0}/notify'.format(self.path))
+        return self.api.put(self.subpath('notify')).json()
+
+    def axfr_retrieve(self):
+        """
+        Ask the server to retrieve this slave zone from its master. Returns the
+        server's answer, the transfer itself happens in the background.
+        """
+        return self.api.put(self.subpath('axfr-retrieve')).json()
+
+class RRsetCollection(object):
+    """
+    A zone's RRsets indexed by (name, type) and by owner name.
+
+    Iterating yields every RRset; `in` accepts an RRset or a (name, type) tuple.
+    """
+
+    __slots__ = ('_by_key', '_by_name')
+
+    def __init__(self, rrsets=()):
+        self._by_key = {}
+        self._by_name = {}
+        for rrset in rrsets:
+            self.add(rrset)
+
+    def add(self, rrset):
+        key = (rrset.name, rrset.type)
+        if key not in self._by_key:
+            self._by_name.setdefault(rrset.name, []).append(rrset)
+        else:
+            names = self._by_name[rrset.name]
+            names[names.index(self._by_key[key])] = rrset
+        self._by_key[key] = rrset
+
+    def get(self, name, type, default=None):
+        return self._by_key.get((name, type), default)
+
+    def by_name(self, name):
+        return list(self._by_name.get(name, ()))
+
+    def names(self):
+        return self._by_name.keys()
+
+    def __contains__(self, item):
+        if isinstance(item, RRset):
+            item = (item.name, item.type)
+        return item in self._by_key
+
+    def __iter__(self):
+        return iter(self._by_key.values())
+
+    def __len__(self):
+        return len(self._by_key)
+
 
 class RRset(object):
 
+    __slots__ = ('name', 'type', 'content', 'disabled', 'ttl', 'records', 'comments')
+
     def __init__(self, name, type, content=None, disabled=False, ttl=None, records=[], comments=[]):
         self.name = name
         self.type = type
@@ -151,6 +497,26 @@ class RRset(object):
             'comments': [comment.to_dict() for comment in self.comments]
         }
 
+    def state(self):
+        """
+        Everything a REPLACE of this RRset sets: the TTL, the records with
+        their disabled and set_ptr flags, and the comments. Two RRsets with
+        the same name, type and state make the same PATCH a no-op.
+        """
+        return (self.ttl,
+                frozenset((record.content, record.disabled, record.set_ptr) for record in self.records),
+                frozenset((comment.content, comment.account, comment.modified_at) for comment in self.comments))
+
+    def digest(self):
+        """
+        Hash of the RRset data: lowercased name, type, TTL and the sorted record
+        contents (whitespace normalised) with their disabled flag. Comments are
+        not included.
+        """
+        records = sorted((' '.join(record.content.split()), record.disabled) for record in self.records)
+        data = json.dumps([self.name.lower(), self.type, self.ttl, records], separators=(',', ':'))
+        return hashlib.sha1(data.encode('utf-8')).digest()
+
     def __eq__(self, other):
         return self.name == other.name and self.type == other.type
 
@@ -160,6 +526,8 @@ class RRset(object):
 
 class Record(object):
 
+    __slots__ = ('content', 'disabled', 'set_ptr')
+
     def __init__(self, content, disabled=False, set_ptr=False):
         self.content = content
         self.disabled = disabled
@@ -181,6 +549,8 @@ class Record(object):
 
 class Comment(object):
 
+    __slots__ = ('content', 'account', 'modified_at')
+
     def __init__(self, content, account, modified_at):
         self.content = content
         self.account = account
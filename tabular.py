@@ -0,0 +1,109 @@
+"""
+Reading the CSV and JSONL input files of apply and add-zones: one object per
+JSONL line or CSV row (with a header row), numbered for error messages. Also
+the JSONL logs that add-zones and snapshot append to while they run.
+"""
+
+import csv
+import json
+import os
+import sys
+
+from contextlib import contextmanager
+
+
+FORMATS = ('csv', 'jsonl')
+
+
+class RowError(ValueError):
+    pass
+
+
+def guess_format(path, format=None):
+    """
+    Return the given format, or the one of the file name: csv for .csv
+    files, jsonl otherwise.
+    """
+    if format is not None:
+        return format
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+@contextmanager
+def open_input(path):
+    """
+    Open an input file for iter_rows, - being stdin, which is left open.
+    """
+    if path == '-':
+        yield sys.stdin
+    else:
+        with open(path, newline='') as fileobj:
+            yield fileobj
+
+
+def iter_rows(fileobj, format='jsonl', errors=None):
+    """
+    Yield (lineno, fields) for every row of a JSONL or CSV file object,
+    fields being a dict without the empty ('' or null) values. Blank JSONL
+    lines and those starting with # are skipped.
+
+    A line that is not a JSON object raises RowError, or with an errors list
+    is appended to it and skipped, so that every error can be reported.
+    """
+    if format == 'csv':
+        reader = csv.DictReader(fileobj)
+        rows = ((reader.line_num, row) for row in reader)
+    elif format == 'jsonl':
+        rows = ((lineno, line) for lineno, line in enumerate(fileobj, 1)
+                if line.strip() and not line.lstrip().startswith('#'))
+    else:
+        raise RowError('unknown file format {!r}, expected one of {}'.format(format, ', '.join(FORMATS)))
+
+    for lineno, fields in rows:
+        try:
+            if not isinstance(fields, dict):
+                try:
+                    fields = json.loads(fields)
+                except ValueError as e:
+                    raise RowError('line {}: invalid JSON: {}'.format(lineno, e))
+                if not isinstance(fields, dict):
+                    raise RowError('line {}: expected an object'.format(lineno))
+        except RowError as e:
+            if errors is None:
+                raise
+            errors.append(str(e))
+            continue
+        yield lineno, {key: value for key, value in fields.items() if value not in (None, '')}
+
+
+def read_log(path):
+    """
+    Return the entries of an append-only JSONL log, none if it doesn't exist.
+
+    A last line cut short by an interrupted run is ignored and removed from
+    the file, so that the next entry appended starts on a line of its own.
+    Other lines that are not JSON objects are skipped.
+    """
+    if not os.path.exists(path):
+        return []
+
+    entries = []
+    with open(path, 'rb+') as log_file:
+        lines = log_file.read().split(b'\n')
+        offset = 0
+        for index, line in enumerate(lines):
+            last = index == len(lines) - 1
+            try:
+                entry = json.loads(line) if line.strip() else None
+            except ValueError:
+                entry = None
+                if last:
+                    log_file.seek(offset)
+                    log_file.truncate()
+            if isinstance(entry, dict):
+                entries.append(entry)
+                if last:
+                    # complete but without its newline
+                    log_file.write(b'\n')
+            offset += len(line) + 1
+    return entries
@@ -0,0 +1,58 @@
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class RateLimiter(object):
+    """
+    Space out calls to wait() so they happen at most rate times per second,
+    across all threads sharing the limiter. A rate of None means no limit.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_concurrently(func, items, workers=8, rate=None):
+    """
+    Call func(item) for every item on a pool of worker threads, starting at
+    most rate calls per second (a RateLimiter may be passed instead).
+
+    Yields (item, result, exception) tuples in completion order. Items are
+    consumed lazily, so only a few more than workers are in flight at a time.
+    """
+    limiter = rate if isinstance(rate, RateLimiter) else RateLimiter(rate)
+
+    def call(item):
+        limiter.wait()
+        return func(item)
+
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while True:
+            for item in items:
+                pending[executor.submit(call, item)] = item
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                return
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                exception = future.exception()
+                yield item, (None if exception else future.result()), exception
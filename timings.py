@@ -0,0 +1,78 @@
+"""
+Hooks for PDNSAPI.add_hook behind the --timings and --trace options.
+"""
+
+import json
+import threading
+
+
+class TimingsCollector(object):
+    """
+    Keep every record to print a summary of where the time went.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def summary(self, slowest=5):
+        requests = [record for record in self.records if record['type'] == 'request']
+        spans = [record for record in self.records if record['type'] == 'span']
+        lines = []
+
+        if requests:
+            lines.append('{:<8} {:>5} {:>10} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+                'requests', 'count', 'bytes', 'connect', 'server', 'transfer', 'decode', 'total'))
+            by_method = {}
+            for record in requests:
+                by_method.setdefault(record['method'], []).append(record)
+            for method, records in sorted(by_method.items()):
+                lines.append(self._request_line(method, records))
+            if len(by_method) > 1:
+                lines.append(self._request_line('all', requests))
+
+            failed = [record for record in requests if record.get('error')]
+            if failed:
+                lines.append('{} failed requests'.format(len(failed)))
+            if len(requests) > 1:
+                lines.append('slowest requests:')
+                for record in sorted(requests, key=lambda record: record['total'], reverse=True)[:slowest]:
+                    lines.append('  {:>8.1f}ms {} {} {}'.format(record['total'] * 1000, record['method'],
+                                                               record['path'], record['status'] or record['error']))
+
+        if spans:
+            lines.append('{:<30} {:>5} {:>9}'.format('spans', 'count', 'total'))
+            by_name = {}
+            for record in spans:
+                by_name.setdefault(record['name'], []).append(record['duration'])
+            for name, durations in sorted(by_name.items(), key=lambda item: -sum(item[1])):
+                lines.append('{:<30} {:>5} {:>7.1f}ms'.format(name, len(durations), sum(durations) * 1000))
+
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _request_line(label, records):
+        def total(field):
+            return sum(record.get(field) or 0 for record in records)
+
+        return '{:<8} {:>5} {:>10} {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms'.format(
+            label, len(records), total('bytes'), total('connect') * 1000, total('server') * 1000,
+            total('transfer') * 1000, total('decode') * 1000, total('total') * 1000)
+
+
+class TraceWriter(object):
+    """
+    Write every record to a file as one JSON object per line, as it happens.
+    """
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.lock:
+            self.fileobj.write(line)
+            self.fileobj.flush()
@@ -0,0 +1,111 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+class ZoneCache(object):
+    """
+    On-disk cache of API responses, one gzipped JSON file per key.
+
+    Entries carry a validator (e.g. the zone serials) and are only returned
+    when the caller presents the same validator, or when no validator is used
+    and the entry is younger than max_age. Entries older than max_age are
+    evicted, then the least recently used ones until the cache fits max_size.
+
+    With lookups disabled the models bypass the cache for reads but still
+    invalidate entries when they change a zone.
+    """
+
+    def __init__(self, path, max_age=86400, max_size=256 * 1024 * 1024, listing_max_age=60):
+        self.lookups = True
+        self.path = os.path.expanduser(path)
+        self.max_age = max_age
+        self.max_size = max_size
+        self.listing_max_age = listing_max_age
+        self._evicted = False
+
+    def _entry_path(self, key):
+        digest = hashlib.sha1(json.dumps(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + '.json.gz')
+
+    def get(self, key, validator=None, max_age=None):
+        """
+        Return the cached data for key, None if missing, stale or unreadable.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with gzip.open(entry_path, 'rt', encoding='utf-8') as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+
+        age = time.time() - entry['stored']
+        if entry['key'] != list(key) or age > self.max_age:
+            return None
+        if validator is None:
+            if max_age is not None and age > max_age:
+                return None
+        elif entry['validator'] != validator:
+            return None
+
+        try:
+            os.utime(entry_path)  # mark as recently used for eviction
+        except OSError:
+            pass
+        return entry['data']
+
+    def put(self, key, data, validator=None):
+        """
+        Store data under key, replacing the old entry atomically.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        if not self._evicted:
+            self.evict()
+
+        entry = {'key': list(key), 'validator': validator, 'stored': time.time(), 'data': data}
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file, \
+                    gzip.GzipFile(fileobj=tmp_file, mode='wb', compresslevel=5) as entry_file:
+                entry_file.write(json.dumps(entry, separators=(',', ':')).encode('utf-8'))
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def invalidate(self, key):
+        self._unlink(self._entry_path(key))
+
+    def evict(self):
+        """
+        Remove expired entries, then the least recently used until under max_size.
+        """
+        self._evicted = True
+        now = time.time()
+        entries = []
+        with os.scandir(self.path) as it:
+            for dir_entry in it:
+                if not dir_entry.name.endswith(('.json.gz', '.tmp')):
+                    continue
+                stat = dir_entry.stat()
+                if now - stat.st_mtime > self.max_age:
+                    self._unlink(dir_entry.path)
+                elif dir_entry.name.endswith('.json.gz'):
+                    entries.append((stat.st_mtime, stat.st_size, dir_entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_size:
+                break
+            self._unlink(entry_path)
+            total -= size
+
+    def _unlink(self, path):
+        # another process may have evicted or replaced the entry already
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,212 @@
+"""
+Readers for local zone files, yielding RRsets in the same shape the API uses.
+
+BIND master files are read line by line; records of one RRset need not be
+adjacent, so callers that need complete RRsets should group by (name, type).
+"""
+
+import itertools
+import re
+
+import jsonstream
+from models import RRset, Record
+
+
+# rdata fields holding domain names that may be relative to the origin
+NAME_FIELDS = {
+    'CNAME': (0,),
+    'DNAME': (0,),
+    'NS': (0,),
+    'PTR': (0,),
+    'MX': (1,),
+    'SRV': (3,),
+    'SOA': (0, 1),
+}
+
+CLASSES = ('IN', 'CH', 'HS')
+
+_ttl_units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+_ttl_re = re.compile(r'^(\d+[smhdw]?)+$', re.IGNORECASE)
+
+
+class ZoneFileError(ValueError):
+    pass
+
+
+def parse_ttl(value):
+    if value.isdigit():
+        return int(value)
+    if not _ttl_re.match(value):
+        raise ValueError(value)
+    return sum(int(number) * _ttl_units[unit.lower() or 's']
+               for number, unit in re.findall(r'(\d+)([smhdw]?)', value, re.IGNORECASE))
+
+
+def _tokenize(line):
+    """
+    Split a line on whitespace and parentheses outside quotes, dropping its
+    comment. Returns the tokens and how many parentheses it left open.
+    """
+    tokens = []
+    token = ''
+    depth = 0
+    quoted = escaped = False
+    for char in line:
+        if escaped:
+            token += char
+            escaped = False
+        elif char == '\\':
+            token += char
+            escaped = True
+        elif char == '"':
+            token += char
+            quoted = not quoted
+        elif quoted:
+            token += char
+        elif char == ';':
+            break
+        elif char.isspace() or char in '()':
+            if token:
+                tokens.append(token)
+                token = ''
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+        else:
+            token += char
+    if token:
+        tokens.append(token)
+    return tokens, depth
+
+
+def _logical_lines(fileobj):
+    """
+    Yield (line number, tokens, indented) per record, joining records that
+    span several lines in parentheses.
+    """
+    pending = None
+    depth = 0
+    for lineno, line in enumerate(fileobj, 1):
+        tokens, opened = _tokenize(line)
+        if pending is None:
+            if not tokens and not opened:
+                continue
+            pending = tokens
+            start = lineno
+            indented = line[:1].isspace()
+        else:
+            pending.extend(tokens)
+        depth += opened
+        if depth <= 0:
+            if pending:
+                yield start, pending, indented
+            pending = None
+            depth = 0
+    if pending is not None:
+        raise ZoneFileError('line {}: unbalanced parentheses'.format(start))
+
+
+def _qualify(name, origin):
+    if name == '@':
+        return origin
+    if name.endswith('.'):
+        return name
+    return '{}.{}'.format(name, origin)
+
+
+def iter_bind_records(fileobj, origin, default_ttl=None):
+    """
+    Yield (name, ttl, type, content) for every record of a BIND master file.
+
+    Records without a TTL get the $TTL (or default_ttl) value, or when there
+    is none the TTL of the last record that had one (RFC 1035):
+
+    >>> zone = ['$TTL 3600', 'a 60 IN A 192.0.2.1', 'b IN A 192.0.2.2']
+    >>> [(name, ttl) for name, ttl, _, _ in iter_bind_records(zone, 'example.org.')]
+    [('a.example.org.', 60), ('b.example.org.', 3600)]
+    """
+    origin = origin if origin.endswith('.') else origin + '.'
+    last_ttl = None
+    owner = None
+
+    for lineno, tokens, indented in _logical_lines(fileobj):
+        try:
+            if tokens[0].upper() == '$ORIGIN':
+                origin = _qualify(tokens[1], origin)
+                continue
+            if tokens[0].upper() == '$TTL':
+                default_ttl = parse_ttl(tokens[1])
+                continue
+            if tokens[0].startswith('$'):
+                raise ZoneFileError('{} is not supported'.format(tokens[0]))
+
+            if not indented:
+                owner = _qualify(tokens.pop(0), origin)
+            elif owner is None:
+                raise ZoneFileError('record without owner name')
+
+            record_ttl = None
+            while tokens and (tokens[0].upper() in CLASSES or _ttl_re.match(tokens[0])):
+                token = tokens.pop(0)
+                if token.upper() not in CLASSES:
+                    record_ttl = parse_ttl(token)
+            if record_ttl is not None:
+                ttl = last_ttl = record_ttl
+            else:
+                ttl = default_ttl if default_ttl is not None else last_ttl
+            if ttl is None:
+                raise ZoneFileError('no TTL given and no $TTL set')
+
+            rrtype = tokens.pop(0).upper()
+            rdata = tokens
+            for index in NAME_FIELDS.get(rrtype, ()):
+                if index < len(rdata):
+                    rdata[index] = _qualify(rdata[index], origin)
+            if rrtype == 'SOA':
+                # refresh, retry, expire and minimum may use units like 1h
+                rdata[3:7] = [str(parse_ttl(value)) for value in rdata[3:7]]
+            if not rdata:
+                raise ZoneFileError('{} record without data'.format(rrtype))
+        except ZoneFileError as e:
+            raise ZoneFileError('line {}: {}'.format(lineno, e))
+        except (IndexError, ValueError):
+            raise ZoneFileError('line {}: cannot parse record'.format(lineno))
+
+        yield owner, ttl, rrtype, ' '.join(rdata)
+
+
+def iter_bind_rrsets(fileobj, origin, default_ttl=None):
+    """
+    Group the records of a BIND master file into RRsets. RRsets are only
+    complete once the whole file has been read, so they are yielded at the end.
+    """
+    rrsets = {}
+    for name, ttl, rrtype, content in iter_bind_records(fileobj, origin, default_ttl):
+        key = (name.lower(), rrtype)
+        rrset = rrsets.get(key)
+        if rrset is None:
+            rrset = rrsets[key] = RRset(name=name, type=rrtype, ttl=ttl)
+        rrset.records.add(Record(content=content))
+    return iter(rrsets.values())
+
+
+def iter_json_rrsets(fileobj, chunk_size=65536):
+    """
+    Stream RRsets from a file holding a zone as returned by the API (an object
+    with an rrsets member) or a plain array of RRsets.
+    """
+    def chunks():
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    first = fileobj.read(1)
+    while first and first.isspace():
+        first = fileobj.read(1)
+    key = 'rrsets' if first == b'{' else None
+    for rrset in jsonstream.iter_items(itertools.chain([first], chunks()), key=key):
+        yield RRset(name=rrset['name'], type=rrset['type'], ttl=rrset.get('ttl'),
+                    records=rrset.get('records', []))
@@ -0,0 +1,134 @@
+import json
+import re
+
+from models import RRset
+from tabular import RowError, iter_rows
+
+
+KINDS = ('Native', 'Master', 'Slave', 'Forwarded')
+SOA_EDIT_API = ('DEFAULT', 'INCREASE', 'EPOCH', 'SOA-EDIT', 'SOA-EDIT-INCREASE')
+
+_list_separator = re.compile(r'[\s,;]+')
+
+
+class ZoneSpecError(ValueError):
+    pass
+
+
+class ZoneSpec(object):
+    """
+    A zone to create, equivalent to one add-zone invocation with optional
+    initial RRsets.
+    """
+
+    def __init__(self, name, kind='Master', nameservers=[], masters=[], account=None, soa_edit_api=None,
+                 rrsets=[]):
+        if not name.endswith('.'):
+            raise ZoneSpecError('zone name {!r} must end with a dot'.format(name))
+        if kind not in KINDS:
+            raise ZoneSpecError('invalid kind {!r}, expected one of {}'.format(kind, ', '.join(KINDS)))
+        if soa_edit_api is not None and soa_edit_api not in SOA_EDIT_API:
+            raise ZoneSpecError('invalid soa_edit_api {!r}, expected one of {}'.format(
+                soa_edit_api, ', '.join(SOA_EDIT_API)))
+        for nameserver in nameservers:
+            if not nameserver.endswith('.'):
+                raise ZoneSpecError('nameserver {!r} must end with a dot'.format(nameserver))
+        if kind == 'Slave' and not masters:
+            raise ZoneSpecError('a Slave zone needs masters')
+        for rrset in rrsets:
+            if rrset.name != name and not rrset.name.endswith('.' + name):
+                raise ZoneSpecError('RRset {} {} is outside the zone'.format(rrset.name, rrset.type))
+            if rrset.name == name and rrset.type == 'NS' and nameservers:
+                raise ZoneSpecError('give either nameservers or an apex NS RRset')
+        self.name = name
+        self.kind = kind
+        self.nameservers = nameservers
+        self.masters = masters
+        self.account = account
+        self.soa_edit_api = soa_edit_api
+        self.rrsets = rrsets
+
+    def zone_data(self):
+        """
+        Return the keyword arguments of Server.create_zone for this zone.
+        """
+        data = {'name': self.name, 'kind': self.kind, 'nameservers': self.nameservers}
+        if self.masters:
+            data['masters'] = self.masters
+        if self.account is not None:
+            data['account'] = self.account
+        if self.soa_edit_api is not None:
+            data['soa_edit_api'] = self.soa_edit_api
+        if self.rrsets:
+            data['rrsets'] = [rrset.to_dict() for rrset in self.rrsets]
+        return data
+
+    def __repr__(self):
+        return '<ZoneSpec {} {}>'.format(self.name, self.kind)
+
+
+def _parse_list(value):
+    if isinstance(value, list):
+        return value
+    return [item for item in _list_separator.split(value.strip()) if item]
+
+
+def _parse_rrset(zone_name, fields):
+    name = fields['name']
+    if not name.endswith('.'):
+        name = zone_name if name in ('', '@') else '{}.{}'.format(name, zone_name)
+    records = [{'content': record} if isinstance(record, str) else record for record in fields['records']]
+    return RRset(name=name, type=fields['type'].upper(), ttl=int(fields.get('ttl', 3600)), records=records)
+
+
+def _parse_spec(fields, lineno):
+    try:
+        rrsets = fields.get('rrsets', [])
+        if isinstance(rrsets, str):
+            # CSV cells hold the RRsets as a JSON list
+            rrsets = json.loads(rrsets)
+        return ZoneSpec(name=fields['name'],
+                        kind=fields.get('kind', 'Master'),
+                        nameservers=_parse_list(fields.get('nameservers', [])),
+                        masters=_parse_list(fields.get('masters', [])),
+                        account=fields.get('account'),
+                        soa_edit_api=fields.get('soa_edit_api'),
+                        rrsets=[_parse_rrset(fields['name'], rrset) for rrset in rrsets])
+    except KeyError as e:
+        raise ZoneSpecError('line {}: missing field {}'.format(lineno, e))
+    except (ZoneSpecError, ValueError, TypeError, AttributeError) as e:
+        raise ZoneSpecError('line {}: {}'.format(lineno, e))
+
+
+def read_zone_specs(fileobj, format='jsonl'):
+    """
+    Read and validate zone specifications from a JSONL or CSV (with a header
+    row) file object.
+
+    Each entry has the fields name, kind, nameservers, masters, account,
+    soa_edit_api and rrsets; only name is required. In CSV, nameservers and
+    masters are separated by spaces, commas or semicolons and rrsets is a
+    JSON list of {"name", "type", "ttl", "records"} objects. Every error in
+    the file is reported at once.
+    """
+    specs = []
+    errors = []
+    lines = {}
+    try:
+        for lineno, fields in iter_rows(fileobj, format, errors=errors):
+            try:
+                spec = _parse_spec(fields, lineno)
+            except ZoneSpecError as e:
+                errors.append(str(e))
+                continue
+            if spec.name in lines:
+                errors.append('line {}: zone {} already given on line {}'.format(lineno, spec.name, lines[spec.name]))
+                continue
+            lines[spec.name] = lineno
+            specs.append(spec)
+    except RowError as e:
+        raise ZoneSpecError(str(e))
+
+    if errors:
+        raise ZoneSpecError('\n'.join(errors))
+    return specs